@@ -0,0 +1,65 @@
+#!/usr/bin/env bash
+
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+# Compare the penpot backend startup with and without the JDK AOT cache built into the rock.
+#
+# The startup is measured as the time from launching the backend, the way the penpot service
+# does, until its /readyz endpoint answers, against throwaway PostgreSQL and Redis containers.
+# A first, untimed start applies the database migrations.
+#
+# Usage: ./benchmark-startup.sh <penpot rock image in the docker daemon> [runs]
+
+set -euo pipefail
+
+IMAGE=${1:?usage: $0 <image> [runs]}
+RUNS=${2:-5}
+NAME=penpot-benchmark-$$
+
+cleanup() {
+  docker rm -f "$NAME-postgresql" "$NAME-redis" >/dev/null 2>&1 || true
+  docker network rm "$NAME" >/dev/null 2>&1 || true
+}
+trap cleanup EXIT
+
+docker network create "$NAME" >/dev/null
+docker run -d --name "$NAME-postgresql" --network "$NAME" \
+  -e POSTGRES_USER=penpot -e POSTGRES_PASSWORD=penpot -e POSTGRES_DB=penpot \
+  postgres:16 >/dev/null
+docker run -d --name "$NAME-redis" --network "$NAME" redis:7 >/dev/null
+until docker exec "$NAME-postgresql" pg_isready -U penpot -d penpot >/dev/null 2>&1; do
+  sleep 1
+done
+
+docker run --rm --network "$NAME" --entrypoint /bin/bash --workdir /opt/penpot/backend \
+  -e JAVA_HOME=/usr/lib/jvm/java-25-openjdk-amd64 \
+  -e PENPOT_TELEMETRY_ENABLED=false \
+  -e PENPOT_PUBLIC_URI=http://localhost:8080 \
+  -e PENPOT_SECRET_KEY="$(head -c 48 /dev/urandom | base64 -w0)" \
+  -e PENPOT_DATABASE_URI="postgresql://$NAME-postgresql/penpot" \
+  -e PENPOT_DATABASE_USERNAME=penpot \
+  -e PENPOT_DATABASE_PASSWORD=penpot \
+  -e PENPOT_REDIS_URI="redis://$NAME-redis/0" \
+  "$IMAGE" -c "
+  set -euo pipefail
+  start_backend() {
+    start=\$(date +%s%N)
+    JDK_JAVA_OPTIONS=\"-XX:+UseG1GC \$*\" ./run.sh >/dev/null 2>&1 &
+    pid=\$!
+    until curl -sf -m 5 -o /dev/null localhost:6060/readyz; do
+      kill -0 \$pid 2>/dev/null || { echo 'backend exited before it was ready' >&2; exit 1; }
+      sleep 0.1
+    done
+    echo \$(( (\$(date +%s%N) - start) / 1000000 ))
+    kill \$pid
+    wait \$pid || true
+  }
+  median() { sort -n | awk '{ v[NR] = \$1 } END { print v[int((NR + 1) / 2)] }'; }
+  start_backend >/dev/null
+  without=\$(for _ in \$(seq $RUNS); do start_backend; done | median)
+  with=\$(for _ in \$(seq $RUNS); do start_backend -XX:AOTCache=penpot.aot; done | median)
+  echo \"median time until the backend is ready over $RUNS runs\"
+  echo \"without AOT cache: \${without} ms\"
+  echo \"with AOT cache:    \${with} ms\"
+"
@@ -7,26 +7,129 @@
 
 """Penpot charm service."""
 
+import dataclasses
+import functools
+import hashlib
+import json
 import logging
+import math
+import os
 import secrets
+import shlex
 import time
 import typing
 import urllib.parse
 
-import dns.resolver
+import opentelemetry.trace
 import ops
-import requests
-from charms.data_platform_libs.v0.data_interfaces import DatabaseRequires
-from charms.data_platform_libs.v0.s3 import S3Requirer
-from charms.grafana_k8s.v0.grafana_dashboard import GrafanaDashboardProvider
-from charms.hydra.v0.oauth import ClientConfig, OAuthRequirer
-from charms.loki_k8s.v1.loki_push_api import LogForwarder
-from charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider
-from charms.redis_k8s.v0.redis import RedisRelationCharmEvents, RedisRequires
-from charms.smtp_integrator.v0.smtp import SmtpRequires, TransportSecurity
-from charms.traefik_k8s.v2.ingress import IngressPerAppRequirer
+from charms.redis_k8s.v0.redis import RedisRelationCharmEvents
+
+import nginx
+import rpc_limits
+
+# The remaining charm libraries and dependencies are imported where they are used, so
+# dispatches that don't need them (like the profile actions) don't pay their import cost.
+if typing.TYPE_CHECKING:
+    from charms.data_platform_libs.v0.data_interfaces import DatabaseRequires
+    from charms.data_platform_libs.v0.s3 import S3Requirer
+    from charms.hydra.v0.oauth import ClientConfig, OAuthRequirer
+    from charms.redis_k8s.v0.redis import RedisRequires
+    from charms.smtp_integrator.v0.smtp import SmtpRequires
+    from charms.traefik_k8s.v2.ingress import IngressPerAppRequirer
 
 logger = logging.getLogger(__name__)
+tracer = opentelemetry.trace.get_tracer(__name__)
+
+# how long the cluster DNS settings checked by the leader are reused before checking again
+CLUSTER_DNS_TTL = 24 * 60 * 60
+
+# values of the exporter-mode configuration option
+EXPORTER_MODES = ("single", "pool")
+
+# cgroup v2 and v1 files holding the memory limit of the penpot container
+CGROUP_MEMORY_LIMIT_FILES = (
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+)
+# cgroup v2 file holding the CPU quota and period, and the cgroup v1 equivalents
+CGROUP_CPU_MAX_FILE = "/sys/fs/cgroup/cpu.max"
+CGROUP_CPU_QUOTA_FILES = (
+    "/sys/fs/cgroup/cpu/cpu.cfs_quota_us",
+    "/sys/fs/cgroup/cpu/cpu.cfs_period_us",
+)
+# part of the container memory limit budgeted for the exporter and the memory of each browser
+EXPORTER_MEMORY_SHARE = 0.25
+EXPORTER_BROWSER_MEMORY_MIB = 512
+
+# values of the backend-gc configuration option
+BACKEND_GCS = ("auto", "g1", "zgc")
+# heap size from which the automatic garbage collector choice switches from G1 to ZGC
+BACKEND_ZGC_MIN_HEAP_MIB = 8 * 1024
+BACKEND_GC_LOG = "/opt/penpot/backend/gc.log"
+# JDK AOT cache trained while building the penpot rock
+BACKEND_AOT_CACHE = "/opt/penpot/backend/penpot.aot"
+
+# pebble custom notice the backend service sends once it's ready to serve requests
+BACKEND_READY_NOTICE = "canonical.com/penpot/backend-ready"
+# failures of the backend-http check, probing every 10 seconds, after which the backend
+# is considered unable to start
+BACKEND_HTTP_CHECK_THRESHOLD = 12
+
+# read-only RPC commands replayed to warm up the backend, and the file receiving the
+# warmup duration in milliseconds once it's over. The warmup has no session, as it would
+# need the credentials of a real profile, so it's limited to the commands answering
+# anonymous calls, which still run the HTTP server, the RPC middlewares and a database query
+BACKEND_WARMUP_COMMANDS = ("get-profile",)
+# time limit of each warmup call, so the warmup always ends and the backend ready notice
+# is always sent
+BACKEND_WARMUP_REQUEST_TIMEOUT = 10
+BACKEND_WARMUP_FILE = "/opt/penpot/backend/.warmup"
+
+# environment variables of the backend database pool sizes
+DATABASE_POOL_ENV = ("PENPOT_DATABASE_MAX_POOL_SIZE", "PENPOT_DATABASE_MIN_POOL_SIZE")
+# values of the database-pooler-mode configuration option
+DATABASE_POOLER_MODES = ("none", "session", "transaction")
+
+# values of the asset-storage configuration option
+ASSET_STORAGES = ("s3", "filesystem")
+# directory of the filesystem assets backend on the assets storage, which the frontend nginx
+# serves from the same path
+ASSETS_DIRECTORY = "/opt/data/assets"
+# user running the penpot services in the penpot rock
+PENPOT_USER_ID = 584792
+
+
+@dataclasses.dataclass(frozen=True)
+class CharmState:  # pylint: disable=too-many-instance-attributes
+    """Integration data resolved once per charm dispatch.
+
+    Attributes:
+        secret_key: Penpot secret key environment variables.
+        postgresql: Penpot postgresql environment variables.
+        redis: Penpot redis environment variables.
+        s3: Penpot s3 environment variables.
+        smtp: Penpot smtp environment variables.
+        oauth: Penpot OpenID Connect environment variables.
+        oauth_related: Whether the oauth integration exists.
+        public_uri: Penpot public URI.
+        cluster_domain: Kubernetes cluster domain name.
+        internal_resolver: Nameserver address used by the penpot frontend.
+        memory_limit: Penpot container memory limit in bytes, None if unlimited.
+        cpu_limit: Penpot container CPU limit in cores, None if unlimited.
+    """
+
+    secret_key: dict[str, str]
+    postgresql: dict[str, str]
+    redis: dict[str, str]
+    s3: dict[str, str]
+    smtp: dict[str, str]
+    oauth: dict[str, str]
+    oauth_related: bool
+    public_uri: str | None
+    cluster_domain: str
+    internal_resolver: str
+    memory_limit: int | None
+    cpu_limit: float | None
 
 
 # needed for charm libraries
@@ -35,6 +138,10 @@ class PenpotCharm(ops.CharmBase):
     """Charm the service."""
 
     on = RedisRelationCharmEvents()
+    _stored = ops.StoredState()
+
+    # actions that never need the integration libraries
+    _ACTIONS_WITHOUT_INTEGRATIONS = frozenset({"create-profile", "delete-profile", "dump-traces"})
 
     def __init__(self, *args: typing.Any):
         """Construct.
@@ -44,14 +151,50 @@ class PenpotCharm(ops.CharmBase):
         """
         super().__init__(*args)
         self.container = self.unit.get_container("penpot")
-        self.postgresql = DatabaseRequires(
-            self, relation_name="postgresql", database_name=self.app.name
-        )
-        self.redis = RedisRequires(self, "redis")
-        self.smtp = SmtpRequires(self)
-        self.s3 = S3Requirer(self, relation_name="s3")
-        self.ingress = IngressPerAppRequirer(self, port=8080)
         self.oauth: OAuthRequirer | None = None
+        self._stored.set_default(
+            plan_fingerprint="",
+            database_connections=0,
+            database_pool_size=0,
+            cluster_dns_checked_at=0.0,
+        )
+        self._reconcile_requested = False
+        if os.environ.get("JUJU_ACTION_NAME") not in self._ACTIONS_WITHOUT_INTEGRATIONS:
+            self._setup_integrations()
+        self.framework.observe(self.framework.on.pre_commit, self._on_pre_commit)
+        self.framework.observe(self.on.upgrade_charm, self._request_reconcile)
+        self.framework.observe(self.on.config_changed, self._request_reconcile)
+        self.framework.observe(self.on.penpot_peer_relation_created, self._request_reconcile)
+        self.framework.observe(self.on.penpot_peer_relation_changed, self._request_reconcile)
+        self.framework.observe(self.on.penpot_peer_relation_departed, self._request_reconcile)
+        self.framework.observe(self.on.secret_changed, self._request_reconcile)
+        self.framework.observe(self.on.postgresql_relation_broken, self._request_reconcile)
+        self.framework.observe(self.on.redis_relation_broken, self._request_reconcile)
+        self.framework.observe(self.on.smtp_relation_broken, self._request_reconcile)
+        self.framework.observe(self.on.penpot_pebble_ready, self._request_reconcile)
+        self.framework.observe(self.on.penpot_pebble_check_failed, self._on_pebble_check)
+        self.framework.observe(self.on.penpot_pebble_check_recovered, self._on_pebble_check)
+        self.framework.observe(self.on.penpot_pebble_custom_notice, self._on_pebble_custom_notice)
+        self.framework.observe(self.on.update_status, self._request_reconcile)
+        self.framework.observe(self.on.oauth_relation_created, self._request_reconcile)
+        self.framework.observe(self.on.oauth_relation_changed, self._request_reconcile)
+        self.framework.observe(self.on.oauth_relation_broken, self._request_reconcile)
+        self.framework.observe(self.on.create_profile_action, self._on_create_profile_action)
+        self.framework.observe(self.on.delete_profile_action, self._on_delete_profile_action)
+        self.framework.observe(
+            self.on.refresh_cluster_dns_action, self._on_refresh_cluster_dns_action
+        )
+        self.framework.observe(self.on.dump_traces_action, self._on_dump_traces_action)
+
+    def _setup_integrations(self) -> None:
+        """Set up the charm libraries and observe the events they emit."""
+        # pylint: disable=import-outside-toplevel
+        from charms.grafana_k8s.v0.grafana_dashboard import GrafanaDashboardProvider
+        from charms.loki_k8s.v1.loki_push_api import LogForwarder
+        from charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider
+
+        self._tracing = ops.tracing.Tracing(self, tracing_relation_name="charm-tracing")
+
         self._grafana_dashboards = GrafanaDashboardProvider(self)
         self._metrics_endpoint = MetricsEndpointProvider(
             self,
@@ -63,29 +206,59 @@ class PenpotCharm(ops.CharmBase):
             ],
         )
         self._log_forwarder = LogForwarder(self)
-        self.framework.observe(self.on.upgrade_charm, self._reconcile)
-        self.framework.observe(self.on.config_changed, self._reconcile)
-        self.framework.observe(self.on.penpot_peer_relation_created, self._reconcile)
-        self.framework.observe(self.on.penpot_peer_relation_changed, self._reconcile)
-        self.framework.observe(self.on.penpot_peer_relation_departed, self._reconcile)
-        self.framework.observe(self.on.secret_changed, self._reconcile)
-        self.framework.observe(self.postgresql.on.database_created, self._reconcile)
-        self.framework.observe(self.postgresql.on.endpoints_changed, self._reconcile)
-        self.framework.observe(self.on.postgresql_relation_broken, self._reconcile)
-        self.framework.observe(self.redis.charm.on.redis_relation_updated, self._reconcile)
-        self.framework.observe(self.on.redis_relation_broken, self._reconcile)
-        self.framework.observe(self.s3.on.credentials_changed, self._reconcile)
-        self.framework.observe(self.s3.on.credentials_gone, self._reconcile)
-        self.framework.observe(self.smtp.on.smtp_data_available, self._reconcile)
-        self.framework.observe(self.on.smtp_relation_broken, self._reconcile)
-        self.framework.observe(self.ingress.on.ready, self._reconcile)
-        self.framework.observe(self.ingress.on.revoked, self._reconcile)
-        self.framework.observe(self.on.penpot_pebble_ready, self._reconcile)
-        self.framework.observe(self.on.oauth_relation_created, self._reconcile)
-        self.framework.observe(self.on.oauth_relation_changed, self._reconcile)
-        self.framework.observe(self.on.oauth_relation_broken, self._reconcile)
-        self.framework.observe(self.on.create_profile_action, self._on_create_profile_action)
-        self.framework.observe(self.on.delete_profile_action, self._on_delete_profile_action)
+        self.framework.observe(self.postgresql.on.database_created, self._request_reconcile)
+        self.framework.observe(self.postgresql.on.endpoints_changed, self._request_reconcile)
+        self.framework.observe(self.redis.charm.on.redis_relation_updated, self._request_reconcile)
+        self.framework.observe(self.s3.on.credentials_changed, self._request_reconcile)
+        self.framework.observe(self.s3.on.credentials_gone, self._request_reconcile)
+        self.framework.observe(self.smtp.on.smtp_data_available, self._request_reconcile)
+        self.framework.observe(self.ingress.on.ready, self._request_reconcile)
+        self.framework.observe(self.ingress.on.revoked, self._request_reconcile)
+
+    @functools.cached_property
+    def postgresql(self) -> "DatabaseRequires":
+        """PostgreSQL integration requirer."""
+        from charms.data_platform_libs.v0.data_interfaces import (  # pylint: disable=import-outside-toplevel
+            DatabaseRequires,
+        )
+
+        return DatabaseRequires(self, relation_name="postgresql", database_name=self.app.name)
+
+    @functools.cached_property
+    def redis(self) -> "RedisRequires":
+        """Redis integration requirer."""
+        from charms.redis_k8s.v0.redis import (  # pylint: disable=import-outside-toplevel
+            RedisRequires,
+        )
+
+        return RedisRequires(self, "redis")
+
+    @functools.cached_property
+    def smtp(self) -> "SmtpRequires":
+        """SMTP integration requirer."""
+        from charms.smtp_integrator.v0.smtp import (  # pylint: disable=import-outside-toplevel
+            SmtpRequires,
+        )
+
+        return SmtpRequires(self)
+
+    @functools.cached_property
+    def s3(self) -> "S3Requirer":
+        """S3 integration requirer."""
+        from charms.data_platform_libs.v0.s3 import (  # pylint: disable=import-outside-toplevel
+            S3Requirer,
+        )
+
+        return S3Requirer(self, relation_name="s3")
+
+    @functools.cached_property
+    def ingress(self) -> "IngressPerAppRequirer":
+        """Ingress integration requirer."""
+        from charms.traefik_k8s.v2.ingress import (  # pylint: disable=import-outside-toplevel
+            IngressPerAppRequirer,
+        )
+
+        return IngressPerAppRequirer(self, port=8080)
 
     def _on_create_profile_action(self, event: ops.ActionEvent) -> None:
         """Handle create-profile action.
@@ -142,48 +315,366 @@ class PenpotCharm(ops.CharmBase):
             return
         event.set_results({"email": email})
 
-    def _reconcile(self, _: ops.EventBase) -> None:
+    def _on_refresh_cluster_dns_action(self, event: ops.ActionEvent) -> None:
+        """Handle refresh-cluster-dns action.
+
+        Args:
+            event: Action event.
+        """
+        if not self.unit.is_leader():
+            event.fail("refresh-cluster-dns must be run on the leader unit")
+            return
+        if not self.model.get_relation("penpot_peer"):
+            event.fail("peer integration is not ready")
+            return
+        discovered = self._discover_cluster_dns()
+        if not discovered:
+            event.fail("cluster DNS lookup failed, the stored settings are kept")
+            return
+        self._store_cluster_dns(discovered)
+        cluster_domain, internal_resolver = discovered
+        event.set_results(
+            {"cluster-domain": cluster_domain, "internal-resolver": internal_resolver}
+        )
+        self._request_reconcile(event)
+
+    def _on_dump_traces_action(self, event: ops.ActionEvent) -> None:
+        """Handle dump-traces action.
+
+        Args:
+            event: Action event.
+        """
+        import local_traces  # pylint: disable=import-outside-toplevel
+
+        try:
+            traces = local_traces.read_traces(
+                self.charm_dir / local_traces.TRACES_FILENAME, event.params["lines"]
+            )
+        except ValueError as exc:
+            event.fail(str(exc))
+            return
+        if not traces:
+            event.fail("no buffered trace data, traces go to the charm-tracing integration if any")
+            return
+        event.set_results({"traces": "\n".join(traces)})
+
+    def _request_reconcile(self, _: ops.EventBase) -> None:
+        """Schedule a reconcile of the penpot services at the end of the dispatch.
+
+        A single dispatch can emit several events that require a reconcile, for example
+        the charm library events emitted alongside a relation-changed event, or deferred
+        events re-emitted before the current one. They all result in a single reconcile.
+        """
+        self._reconcile_requested = True
+
+    def _on_pebble_check(self, event: ops.PebbleCheckEvent) -> None:
+        """Handle pebble check-failed and check-recovered events.
+
+        Only the backend checks affect the unit status, the exporter check is handled
+        by pebble restarting the exporter service.
+
+        Args:
+            event: Pebble check event.
+        """
+        if event.info.name.startswith("backend"):
+            self._request_reconcile(event)
+
+    def _on_pebble_custom_notice(self, event: ops.PebbleCustomNoticeEvent) -> None:
+        """Handle pebble custom notices sent by the penpot services.
+
+        Args:
+            event: Pebble custom notice event.
+        """
+        if event.notice.key == BACKEND_READY_NOTICE:
+            self._request_reconcile(event)
+
+    def _on_pre_commit(self, _: ops.EventBase) -> None:
+        """Run the reconcile requested by the events of the current dispatch."""
+        if self._reconcile_requested:
+            self._reconcile_requested = False
+            self._reconcile()
+
+    @tracer.start_as_current_span("reconcile")
+    def _reconcile(self) -> None:
         """Reconcile penpot services."""
         oauth = self._get_oauth()
         if oauth:
             oauth.update_client_config(self._get_oauth_client_config())
-        if not self._check_ready():
+        state = self._load_state()
+        if not self._check_ready(state):
             if self.container.can_connect() and self.container.get_services():
                 self.container.stop("backend")
                 self.container.stop("frontend")
                 self.container.stop("exporter")
             return
-        self.container.add_layer("penpot", self._gen_pebble_plan(), combine=True)
-        self.container.replan()
-        self.container.start("backend")
-        self.container.start("frontend")
-        if self.unit.name == self._get_penpot_exporter_unit():
-            self.container.start("exporter")
-        else:
-            self.container.stop("exporter")
-        deadline = time.time() + 120
-        self.unit.status = ops.WaitingStatus("waiting for penpot services")
-        while time.time() < deadline:
-            if self._check_penpot_backend_ready():
-                self.unit.status = ops.ActiveStatus()
-                return
-            time.sleep(3)
-        self.unit.status = ops.BlockedStatus("timeout waiting for penpot services")
+        self._prepare_assets_directory()
+        services = ["backend", "frontend"]
+        if self._runs_penpot_exporter():
+            services.append("exporter")
+        nginx_changed = self._push_nginx_config(state)
+        climit_changed = self._push_rpc_limits()
+        layer = self._gen_pebble_plan(state)
+        self._keep_database_pool(layer, services)
+        restarted = self._apply_pebble_plan(layer, services)
+        backend_environment = layer["services"]["backend"]["environment"]
+        self._stored.database_pool_size = int(backend_environment.get(DATABASE_POOL_ENV[0], 0))
+        if restarted:
+            logger.info("restarted penpot services: %s", ", ".join(restarted))
+        self._reload_changed_config(
+            restarted, nginx_changed=nginx_changed, climit_changed=climit_changed
+        )
+        self.unit.status = self._get_running_status()
 
+    def _get_running_status(self) -> ops.StatusBase:
+        """Retrieve the unit status once the penpot services are started.
+
+        The backend sends a pebble custom notice once it's ready, and the backend-http
+        pebble check emits check-failed and check-recovered events when the backend
+        stops or resumes answering, which run the reconcile again to update the status.
+        The check only fails after BACKEND_HTTP_CHECK_THRESHOLD failed probes, so a
+        backend that never becomes ready blocks the unit.
+
+        Returns:
+            Unit status.
+        """
+        if not self._check_penpot_backend_ready():
+            check = self.container.get_checks("backend-http").get("backend-http")
+            if check and check.status == ops.pebble.CheckStatus.DOWN:
+                return ops.BlockedStatus("timeout waiting for penpot services")
+            return ops.WaitingStatus("waiting for penpot services")
+        if self.config.get("backend-warmup-requests"):
+            warmup_duration = self._read_container_file(BACKEND_WARMUP_FILE)
+            if warmup_duration is None:
+                return ops.WaitingStatus("waiting for penpot backend warmup")
+            logger.info("penpot backend warmup took %s ms", warmup_duration)
+        if self._get_penpot_unit_role() == "worker":
+            return ops.ActiveStatus("background worker")
+        return ops.ActiveStatus()
+
+    @tracer.start_as_current_span("apply pebble plan")
+    def _apply_pebble_plan(self, layer: ops.pebble.LayerDict, services: list[str]) -> list[str]:
+        """Apply the penpot pebble layer, restarting only the services that changed.
+
+        A service is restarted when its definition in the layer differs from the one in
+        the current plan. Services that should run but are stopped are started, and
+        services that should not run on this unit are stopped.
+
+        Args:
+            layer: Penpot pebble layer.
+            services: Names of the services that should be running on this unit.
+
+        Returns:
+            Names of the services that were started or restarted.
+        """
+        running = {
+            name for name, info in self.container.get_services().items() if info.is_running()
+        }
+        fingerprint = _plan_fingerprint(layer, services)
+        if fingerprint == self._stored.plan_fingerprint and running.issuperset(services):
+            return []
+        plan = self.container.get_plan()
+        changed = [
+            name
+            for name, service in layer.get("services", {}).items()
+            if name not in plan.services
+            or _service_definition(plan.services[name])
+            != _service_definition(ops.pebble.Service(name, service))
+        ]
+        checks_changed = any(
+            name not in plan.checks or plan.checks[name] != ops.pebble.Check(name, check)
+            for name, check in layer.get("checks", {}).items()
+        )
+        if changed or checks_changed:
+            self.container.add_layer("penpot", layer, combine=True)
+        restart = [name for name in services if name in changed or name not in running]
+        if restart:
+            self.container.restart(*restart)
+        stop = [name for name in layer.get("services", {}) if name not in services]
+        if running.intersection(stop):
+            self.container.stop(*sorted(running.intersection(stop)))
+        self._stored.plan_fingerprint = fingerprint
+        return restart
+
+    def _keep_database_pool(self, layer: ops.pebble.LayerDict, services: list[str]) -> None:
+        """Keep the database pool size of the running backend when its share grows.
+
+        When the application scales up, the share of every unit shrinks and is applied
+        right away, restarting the backends, so the pools stay within the
+        database-connections budget. When it scales down, the share grows and the backend
+        keeps its smaller pool until it restarts for another reason, like a refresh, a
+        configuration change or a pod restart, rather than restarting every backend at
+        once. A change of the budget itself is applied right away.
+
+        Args:
+            layer: Penpot pebble layer, updated with the pool size of the running backend.
+            services: Names of the services that should be running on this unit.
+        """
+        budget = int(self.config.get("database-connections", 0))
+        if budget != self._stored.database_connections:
+            self._stored.database_connections = budget
+            return
+        service = layer["services"]["backend"]
+        environment = service["environment"]
+        kept = typing.cast(int, self._stored.database_pool_size)
+        share = int(environment.get(DATABASE_POOL_ENV[0], 0))
+        if not kept or not share or kept >= share:
+            return
+        shared = {name: environment[name] for name in DATABASE_POOL_ENV}
+        environment.update(dict(zip(DATABASE_POOL_ENV, (str(kept), str(kept // 4)), strict=True)))
+        if _plan_fingerprint(layer, services) == self._stored.plan_fingerprint:
+            return
+        current = self.container.get_plan().services.get("backend")
+        if not current or _service_definition(
+            ops.pebble.Service("backend", service)
+        ) != _service_definition(current):
+            # the backend restarts anyway, with its new share
+            environment.update(shared)
+
+    def _prepare_assets_directory(self) -> None:
+        """Create the directory of the filesystem assets backend on the assets storage.
+
+        The storage is mounted owned by root, while the penpot services run as the rock
+        user.
+        """
+        if self.config.get("asset-storage") != "filesystem":
+            return
+        self.container.make_dir(
+            ASSETS_DIRECTORY,
+            make_parents=True,
+            user_id=PENPOT_USER_ID,
+            group_id=PENPOT_USER_ID,
+        )
+
+    @tracer.start_as_current_span("push nginx configuration")
+    def _push_nginx_config(self, state: CharmState) -> bool:
+        """Push the frontend nginx configuration files managed by the charm.
+
+        The nginx workers default to one per CPU of the container CPU limit, since nginx
+        counts the CPUs of the node otherwise.
+
+        Args:
+            state: Charm state snapshot.
+
+        Returns:
+            True if any of the configuration files changed.
+        """
+        changed = False
+        worker_processes = int(self.config.get("frontend-worker-processes", 0))
+        if not worker_processes and state.cpu_limit:
+            worker_processes = math.ceil(state.cpu_limit)
+        asset_cache_size = 0
+        if self.config.get("asset-storage") == "s3":
+            asset_cache_size = int(self.config.get("asset-cache-size", 0))
+        config = nginx.generate_config(
+            worker_processes=worker_processes or None,
+            worker_connections=int(self.config.get("frontend-worker-connections", 8192)),
+            asset_cache_size=asset_cache_size,
+            upstream_keepalive=int(self.config.get("frontend-upstream-keepalive", 32)),
+            upstream_keepalive_requests=int(
+                self.config.get("frontend-upstream-keepalive-requests", 1000)
+            ),
+            upstream_keepalive_timeout=int(
+                self.config.get("frontend-upstream-keepalive-timeout", 60)
+            ),
+            local_exporter=self._runs_penpot_exporter(),
+            api_backends=self._get_penpot_api_backends(),
+        )
+        for path, content in config.items():
+            if self._read_container_file(path) == content.strip():
+                continue
+            self.container.push(path, content, make_dirs=True)
+            changed = True
+        return changed
+
+    @tracer.start_as_current_span("push rpc limits")
+    def _push_rpc_limits(self) -> bool:
+        """Push the RPC rate and concurrency limits files of the penpot backend.
+
+        Returns:
+            True if the concurrency limits file changed.
+        """
+        climit_changed = False
+        rate_limits = str(self.config.get("rpc-rate-limits", ""))
+        if rate_limits:
+            content = rpc_limits.generate_rlimit_config(rate_limits)
+            if self._read_container_file(rpc_limits.RLIMIT_CONFIG_FILE) != content.strip():
+                self.container.push(rpc_limits.RLIMIT_CONFIG_FILE, content, make_dirs=True)
+        concurrency_limits = str(self.config.get("rpc-concurrency-limits", ""))
+        if concurrency_limits:
+            defaults = self._read_container_file(rpc_limits.CLIMIT_DEFAULTS_FILE)
+            if defaults is None:
+                logger.warning("penpot default concurrency limits not found in the rock")
+            content = rpc_limits.generate_climit_config(concurrency_limits, defaults or "")
+            if self._read_container_file(rpc_limits.CLIMIT_CONFIG_FILE) != content.strip():
+                self.container.push(rpc_limits.CLIMIT_CONFIG_FILE, content, make_dirs=True)
+                climit_changed = True
+        return climit_changed
+
+    def _reload_changed_config(
+        self, restarted: list[str], *, nginx_changed: bool, climit_changed: bool
+    ) -> None:
+        """Make the running services pick up their configuration files that changed.
+
+        Args:
+            restarted: Names of the services just started or restarted.
+            nginx_changed: Whether the frontend nginx configuration changed.
+            climit_changed: Whether the backend concurrency limits changed.
+        """
+        if nginx_changed and "frontend" not in restarted:
+            # nginx reloads its configuration without dropping connections on SIGHUP
+            self.container.send_signal("SIGHUP", "frontend")
+        if climit_changed and "backend" not in restarted:
+            # unlike the rate limits, the concurrency limits are only read at startup
+            self.container.restart("backend")
+            logger.info("restarted penpot services: backend")
+
+    @tracer.start_as_current_span("check backend readiness")
     def _check_penpot_backend_ready(self) -> bool:  # pragma: nocover
         """Check penpot backend is ready.
 
         Returns:
             True if the penpot backend is ready, False otherwise.
         """
+        import requests  # pylint: disable=import-outside-toplevel
+
         try:
             return requests.get("http://localhost:6060/readyz", timeout=1).text == "OK"
         except (requests.exceptions.RequestException, TimeoutError):
             return False
 
-    def _gen_pebble_plan(self) -> ops.pebble.LayerDict:
+    @tracer.start_as_current_span("load charm state")
+    def _load_state(self) -> CharmState:
+        """Resolve the integration data used by the current dispatch.
+
+        Each integration is read from Juju exactly once, so the plan and status code
+        should read from the returned snapshot instead of calling the getters again.
+
+        Returns:
+            Charm state snapshot.
+        """
+        cluster_domain, internal_resolver = self._get_cluster_dns()
+        return CharmState(
+            secret_key=self._get_penpot_secret_key(),
+            postgresql=self._get_postgresql_credentials(),
+            redis=self._get_redis_credentials(),
+            s3=self._get_s3_credentials(),
+            smtp=self._get_smtp_credentials(),
+            oauth=self._get_penpot_oauth_config(),
+            oauth_related=self.model.get_relation("oauth") is not None,
+            public_uri=self._get_public_uri(),
+            cluster_domain=cluster_domain,
+            internal_resolver=internal_resolver,
+            memory_limit=self._get_container_memory_limit(),
+            cpu_limit=self._get_container_cpu_limit(),
+        )
+
+    @tracer.start_as_current_span("generate pebble plan")
+    def _gen_pebble_plan(self, state: CharmState) -> ops.pebble.LayerDict:
         """Generate penpot pebble plan.
 
+        Args:
+            state: Charm state snapshot.
+
         Returns:
             Penpot pebble plan.
         """
@@ -198,26 +689,30 @@ class PenpotCharm(ops.CharmBase):
                     "after": ["backend"],
                     "environment": {
                         "PENPOT_BACKEND_URI": "http://127.0.0.1:6060",
-                        "PENPOT_EXPORTER_URI": self._get_penpot_exporter_uri(),
-                        "PENPOT_INTERNAL_RESOLVER": self._get_local_resolver(),
-                        "PENPOT_FLAGS": " ".join(self._get_penpot_frontend_options()),
+                        "PENPOT_EXPORTER_URI": self._get_penpot_exporter_uri(state),
+                        "PENPOT_INTERNAL_RESOLVER": self._get_penpot_internal_resolver(state),
+                        "PENPOT_FLAGS": " ".join(self._get_penpot_frontend_options(state)),
                     },
                 },
                 "backend": {
-                    "command": "/opt/penpot/backend/run.sh",
+                    "command": self._get_penpot_backend_command(),
                     "override": "replace",
                     "working-dir": "/opt/penpot/backend/",
                     "environment": {
                         "JAVA_HOME": "/usr/lib/jvm/java-25-openjdk-amd64",
+                        "JDK_JAVA_OPTIONS": " ".join(self._get_penpot_backend_jvm_options(state)),
                         "PENPOT_TELEMETRY_ENABLED": "false",
-                        "PENPOT_PUBLIC_URI": typing.cast(str, self._get_public_uri()),
-                        "PENPOT_FLAGS": " ".join(self._get_penpot_backend_options()),
-                        **self._get_penpot_secret_key(),
-                        **self._get_postgresql_credentials(),
-                        **self._get_redis_credentials(),
-                        **self._get_smtp_credentials(),
-                        **self._get_s3_credentials(),
-                        **self._get_penpot_oauth_config(),
+                        "PENPOT_PUBLIC_URI": typing.cast(str, state.public_uri),
+                        "PENPOT_FLAGS": " ".join(self._get_penpot_backend_options(state)),
+                        **self._get_penpot_backend_http_threads(state),
+                        **self._get_penpot_rpc_limits_files(),
+                        **state.secret_key,
+                        **state.postgresql,
+                        **self._get_penpot_database_pool(),
+                        **state.redis,
+                        **state.smtp,
+                        **self._get_penpot_assets_storage(state),
+                        **state.oauth,
                     },
                 },
                 "exporter": {
@@ -225,11 +720,13 @@ class PenpotCharm(ops.CharmBase):
                     "working-dir": "/opt/penpot/exporter/",
                     "override": "replace",
                     "after": ["backend", "frontend"],
+                    "on-check-failure": {"exporter-alive": "restart"},
                     "environment": {
                         "PENPOT_PUBLIC_URI": "http://127.0.0.1:8080",
                         "PLAYWRIGHT_BROWSERS_PATH": "/opt/penpot/exporter/browsers",
-                        **self._get_penpot_secret_key(),
-                        **self._get_redis_credentials(),
+                        **state.secret_key,
+                        **state.redis,
+                        **self._get_penpot_exporter_limits(state),
                     },
                 },
             },
@@ -238,43 +735,151 @@ class PenpotCharm(ops.CharmBase):
                     "override": "replace",
                     "level": "alive",
                     "period": "30s",
+                    "threshold": 3,
                     "exec": {
                         # pylint: disable=line-too-long
                         "command": 'bash -c "pebble services backend | grep -q inactive || curl -f -m 5 localhost:6060/readyz"'
                     },
-                }
+                },
+                "backend-http": {
+                    "override": "replace",
+                    "period": "10s",
+                    "threshold": BACKEND_HTTP_CHECK_THRESHOLD,
+                    "http": {"url": "http://localhost:6060/readyz"},
+                },
+                # pebble ready-level checks drive the pod readiness, which keeps the unit out
+                # of the Kubernetes service endpoints until the backend is warmed up
+                "backend-warmup": {
+                    "override": "replace",
+                    "level": "ready",
+                    "period": "10s",
+                    "threshold": 1,
+                    "exec": {
+                        "command": (
+                            f"test -f {BACKEND_WARMUP_FILE}"
+                            if self.config.get("backend-warmup-requests")
+                            else "true"
+                        )
+                    },
+                },
+                # restarts the exporter only, through on-check-failure, so it has no level to
+                # stay out of the pod probes, and passes while the exporter is stopped, as it
+                # is on the units that don't run it
+                "exporter-alive": {
+                    "override": "replace",
+                    "period": "30s",
+                    "threshold": 3,
+                    "exec": {
+                        # pylint: disable=line-too-long
+                        "command": 'bash -c "pebble services exporter | grep -q inactive || curl -s -m 5 -o /dev/null localhost:6061"'
+                    },
+                },
             },
         )
         return plan
 
-    def _check_ready(self) -> bool:
+    @tracer.start_as_current_span("check requirements")
+    def _check_ready(self, state: CharmState) -> bool:
         """Check if penpot is ready to start.
 
+        Args:
+            state: Charm state snapshot.
+
         Returns:
             True if penpot is ready to start.
         """
-        public_uri = self._get_public_uri()
+        config_error = self._validate_config()
+        if config_error:
+            self.unit.status = ops.BlockedStatus(config_error)
+            return False
+        public_uri = state.public_uri
         requirements = {
-            "peer integration": self._get_penpot_secret_key(),
-            "postgresql": self._get_postgresql_credentials(),
-            "redis": self._get_redis_credentials(),
-            "s3": self._get_s3_credentials(),
+            "peer integration": state.secret_key,
+            "postgresql": state.postgresql,
+            "redis": state.redis,
             "ingress": public_uri,
             "penpot container": self.container.can_connect(),
             "https enabled on ingress": not public_uri or public_uri.startswith("https://"),
-            "OpenID provider data": (
-                not self.model.get_relation("oauth") or self._get_penpot_oauth_config()
-            ),
+            "OpenID provider data": not state.oauth_related or state.oauth,
         }
-        if self._get_penpot_oauth_config():
+        if self.config.get("asset-storage") == "filesystem":
+            requirements["assets storage"] = bool(self.model.storages["assets"])
+        else:
+            requirements["s3"] = state.s3
+        if state.oauth:
             # SMTP is required for the OpenID Connect-based registration process
-            requirements["smtp"] = self._get_smtp_credentials()
+            requirements["smtp"] = state.smtp
         unfulfilled = sorted([k for k, v in requirements.items() if not v])
         if unfulfilled:
             self.unit.status = ops.BlockedStatus(f"waiting for {', '.join(unfulfilled)}")
             return False
+        peer_relation = typing.cast(ops.Relation, self.model.get_relation("penpot_peer"))
+        if self.config.get("asset-storage") == "filesystem" and peer_relation.units:
+            # Juju provisions a separate volume for each unit of a Kubernetes application
+            self.unit.status = ops.BlockedStatus("filesystem asset storage requires a single unit")
+            return False
         return True
 
+    def _validate_config(self) -> str | None:
+        """Validate the charm configuration.
+
+        Returns:
+            Description of the first invalid configuration option, None if all are valid.
+        """
+        exporter_mode = self.config.get("exporter-mode")
+        if exporter_mode not in EXPORTER_MODES:
+            return f"invalid exporter-mode: {exporter_mode}"
+        pooler_mode = self.config.get("database-pooler-mode")
+        if pooler_mode not in DATABASE_POOLER_MODES:
+            return f"invalid database-pooler-mode: {pooler_mode}"
+        asset_storage = self.config.get("asset-storage")
+        if asset_storage not in ASSET_STORAGES:
+            return f"invalid asset-storage: {asset_storage}"
+        backend_gc = self.config.get("backend-gc")
+        if backend_gc not in BACKEND_GCS:
+            return f"invalid backend-gc: {backend_gc}"
+        if int(self.config.get("frontend-worker-connections", 8192)) < 1:
+            return "invalid frontend-worker-connections: must be positive"
+        for option in (
+            "frontend-upstream-keepalive-requests",
+            "frontend-upstream-keepalive-timeout",
+        ):
+            if int(self.config.get(option, 1)) < 1:
+                return f"invalid {option}: must be positive"
+        for option in (
+            "frontend-worker-processes",
+            "frontend-upstream-keepalive",
+            "frontend-dns-cache-ttl",
+            "exporter-browser-pool-size",
+            "exporter-max-heap-size",
+            "backend-max-heap-size",
+            "backend-warmup-requests",
+            "backend-io-threads",
+            "backend-executor-threads",
+            "worker-units",
+            "asset-cache-size",
+            "database-connections",
+        ):
+            if int(self.config.get(option, 0)) < 0:
+                return f"invalid {option}: must not be negative"
+        return self._validate_rpc_limits()
+
+    def _validate_rpc_limits(self) -> str | None:
+        """Validate the RPC limits configuration options.
+
+        Returns:
+            Description of the first invalid RPC limits option, None if both are valid.
+        """
+        try:
+            if self.config.get("rpc-rate-limits"):
+                rpc_limits.generate_rlimit_config(str(self.config["rpc-rate-limits"]))
+            if self.config.get("rpc-concurrency-limits"):
+                rpc_limits.generate_climit_config(str(self.config["rpc-concurrency-limits"]))
+        except ValueError as exc:
+            return str(exc)
+        return None
+
+    @tracer.start_as_current_span("get penpot secret key")
     def _get_penpot_secret_key(self) -> dict[str, str]:
         """Retrieve or generate a Penpot secret key.
 
@@ -302,6 +907,7 @@ class PenpotCharm(ops.CharmBase):
             k.replace("-", "_").upper(): v for k, v in secret.get_content(refresh=True).items()
         }
 
+    @tracer.start_as_current_span("get postgresql credentials")
     def _get_postgresql_credentials(self) -> dict[str, str]:
         """Get penpot postgresql credentials from the postgresql integration.
 
@@ -317,12 +923,37 @@ class PenpotCharm(ops.CharmBase):
         password = self.postgresql.fetch_relation_field(relation.id, "password")
         if not all((endpoint, database, username, password)):
             return {}
+        uri = f"postgresql://{endpoint}/{database}"
+        if self.config.get("database-pooler-mode") == "transaction":
+            # a transaction pooler hands each transaction to any server connection, where
+            # the statements prepared by the JDBC driver on another one don't exist
+            uri += "?prepareThreshold=0"
         return {
-            "PENPOT_DATABASE_URI": f"postgresql://{endpoint}/{database}",
+            "PENPOT_DATABASE_URI": uri,
             "PENPOT_DATABASE_USERNAME": username,
             "PENPOT_DATABASE_PASSWORD": password,
         }
 
+    def _get_penpot_database_pool(self) -> dict[str, str]:
+        """Retrieve the database connection pool size of the penpot backend.
+
+        The database-connections budget is shared evenly by the penpot units. A running
+        backend only picks up a larger share when it restarts, see _keep_database_pool.
+
+        Returns:
+            Penpot database pool environment variables, empty to keep penpot defaults.
+        """
+        budget = int(self.config.get("database-connections", 0))
+        if not budget:
+            return {}
+        relation = typing.cast(ops.Relation, self.model.get_relation("penpot_peer"))
+        max_pool_size = max(1, budget // (len(relation.units) + 1))
+        return {
+            "PENPOT_DATABASE_MAX_POOL_SIZE": str(max_pool_size),
+            "PENPOT_DATABASE_MIN_POOL_SIZE": str(max_pool_size // 4),
+        }
+
+    @tracer.start_as_current_span("get redis credentials")
     def _get_redis_credentials(self) -> dict[str, str]:
         """Get penpot redis credentials from the redis integration.
 
@@ -339,6 +970,7 @@ class PenpotCharm(ops.CharmBase):
             return {"PENPOT_REDIS_URI": url}
         return {}
 
+    @tracer.start_as_current_span("get smtp credentials")
     def _get_smtp_credentials(self) -> dict[str, str]:
         """Get penpot smtp credentials from the smtp integration.
 
@@ -351,6 +983,10 @@ class PenpotCharm(ops.CharmBase):
         smtp_data = self.smtp.get_relation_data()
         if not smtp_data:
             return {}
+        from charms.smtp_integrator.v0.smtp import (  # pylint: disable=import-outside-toplevel
+            TransportSecurity,
+        )
+
         from_address = f"{smtp_data.user or 'no-reply'}@{smtp_data.domain}"
         config_from_address = self.config.get("smtp-from-address")
         if config_from_address:
@@ -377,6 +1013,7 @@ class PenpotCharm(ops.CharmBase):
             smtp_credentials["PENPOT_SMTP_SSL"] = "true"
         return smtp_credentials
 
+    @tracer.start_as_current_span("get s3 credentials")
     def _get_s3_credentials(self) -> dict[str, str]:
         """Get penpot s3 credentials from the s3 integration.
 
@@ -398,6 +1035,22 @@ class PenpotCharm(ops.CharmBase):
             "PENPOT_STORAGE_ASSETS_S3_ENDPOINT": s3_data["endpoint"],
         }
 
+    def _get_penpot_assets_storage(self, state: CharmState) -> dict[str, str]:
+        """Get the environment variables of the penpot assets storage backend.
+
+        Args:
+            state: Charm state snapshot.
+
+        Returns:
+            Penpot assets storage environment variables.
+        """
+        if self.config.get("asset-storage") == "filesystem":
+            return {
+                "PENPOT_ASSETS_STORAGE_BACKEND": "assets-fs",
+                "PENPOT_STORAGE_ASSETS_FS_DIRECTORY": ASSETS_DIRECTORY,
+            }
+        return state.s3
+
     def _get_public_uri(self) -> str | None:
         """Get penpot public URI.
 
@@ -406,24 +1059,30 @@ class PenpotCharm(ops.CharmBase):
         """
         return self.ingress.url
 
-    def _get_penpot_frontend_options(self) -> list[str]:
+    def _get_penpot_frontend_options(self, state: CharmState) -> list[str]:
         """Retrieve the penpot options for the penpot frontend.
 
+        Args:
+            state: Charm state snapshot.
+
         Returns:
             Penpot frontend options.
         """
         options = [
             "disable-onboarding-questions",
         ]
-        if self._get_penpot_oauth_config():
+        if state.oauth:
             options.extend(["enable-login-with-oidc", "disable-login-with-password"])
         else:
             options.extend(["disable-registration", "enable-login-with-password"])
         return sorted(options)
 
-    def _get_penpot_backend_options(self) -> list[str]:
+    def _get_penpot_backend_options(self, state: CharmState) -> list[str]:
         """Retrieve the penpot options for the penpot backend.
 
+        Args:
+            state: Charm state snapshot.
+
         Returns:
             Penpot backend options.
         """
@@ -432,27 +1091,246 @@ class PenpotCharm(ops.CharmBase):
             "disable-telemetry",
             "disable-onboarding-questions",
             "disable-log-emails",
-            ("enable" if self._get_smtp_credentials() else "disable") + "-smtp",
+            ("enable" if state.smtp else "disable") + "-smtp",
         ]
-        if self._get_penpot_oauth_config():
+        if state.oauth:
             options.extend(["enable-login-with-oidc", "disable-login-with-password"])
         else:
             options.extend(["disable-registration", "enable-login-with-password"])
+        if self._get_penpot_unit_role() == "api":
+            # the worker runs the queued tasks and the scheduled jobs like the storage GC
+            options.append("disable-backend-worker")
+        if self.config.get("rpc-rate-limits"):
+            options.append("enable-rpc-rlimit")
+        if self.config.get("rpc-concurrency-limits"):
+            options.append("enable-rpc-climit")
         return sorted(options)
 
-    def _get_local_resolver(self) -> str:
-        """Retrieve the current nameserver address being used.
+    def _get_penpot_rpc_limits_files(self) -> dict[str, str]:
+        """Retrieve the paths of the RPC limits files of the penpot backend.
 
         Returns:
-            The address of the nameserver.
+            Penpot RPC limits environment variables.
         """
-        kube_dns = f"kube-dns.kube-system.svc.{self._get_kubernetes_cluster_domain()}"
+        files = {}
+        if self.config.get("rpc-rate-limits"):
+            files["PENPOT_RPC_RLIMIT_CONFIG"] = rpc_limits.RLIMIT_CONFIG_FILE
+        if self.config.get("rpc-concurrency-limits"):
+            files["PENPOT_RPC_CLIMIT_CONFIG"] = rpc_limits.CLIMIT_CONFIG_FILE
+        return files
+
+    def _get_penpot_backend_command(self) -> str:
+        """Retrieve the command of the penpot backend service.
+
+        The backend starts along with a background job that waits for the backend to be
+        ready and sends the BACKEND_READY_NOTICE pebble notice, so the charm updates the
+        unit status as soon as the backend is ready. With backend-warmup-requests set,
+        the job first replays read-only RPC calls against the backend so the JIT
+        compiles the hot paths, and writes how long it took to the warmup file. The notice
+        is only sent once the warmup is over, and a failed warmup call doesn't stop it.
+
+        Returns:
+            Penpot backend command.
+        """
+        job = "until curl -sf -m 5 -o /dev/null localhost:6060/readyz; do sleep 1; done; "
+        warmup_requests = int(self.config.get("backend-warmup-requests", 0))
+        if warmup_requests:
+            commands = ",".join(BACKEND_WARMUP_COMMANDS)
+            job += (
+                "start=$(date +%s%N); "
+                f"curl -s -Z --parallel-max 4 -m {BACKEND_WARMUP_REQUEST_TIMEOUT} "
+                '-H "Content-Type: application/json" -d "{}" '
+                f'"http://localhost:6060/api/rpc/command/{{{commands}}}'
+                f'?warmup=[1-{warmup_requests}]" > /dev/null; '
+                f"echo $(( ($(date +%s%N) - start) / 1000000 )) > {BACKEND_WARMUP_FILE}; "
+            )
+        script = (
+            f"rm -f {BACKEND_WARMUP_FILE}; ({job}pebble notify {BACKEND_READY_NOTICE}) & "
+            "exec /opt/penpot/backend/run.sh"
+        )
+        return f"bash -c {shlex.quote(script)}"
+
+    def _get_penpot_backend_jvm_options(self, state: CharmState) -> list[str]:
+        """Retrieve the JVM options of the penpot backend.
+
+        The heap is sized from the penpot container memory limit, leaving room for the
+        exporter when this unit runs it, and the JVM is given the container CPU limit as
+        processor count. With the `auto` garbage collector, generational ZGC is used for
+        large heaps, where G1 pauses get long, and G1 otherwise. The AOT cache shipped
+        in the rock is used unless disabled, or with ZGC, which it doesn't support in
+        Java 25. The executor threads default to the container CPU limit.
+
+        Args:
+            state: Charm state snapshot.
+
+        Returns:
+            Penpot backend JVM options.
+        """
+        options = []
+        heap_size = int(self.config.get("backend-max-heap-size", 0))
+        if heap_size:
+            options.append(f"-Xmx{heap_size}m")
+        elif state.memory_limit:
+            ram_percentage = 50 if self._runs_penpot_exporter() else 65
+            options.append(f"-XX:MaxRAMPercentage={ram_percentage}")
+            heap_size = state.memory_limit * ram_percentage // 100 // 2**20
+        if state.cpu_limit:
+            options.append(f"-XX:ActiveProcessorCount={math.ceil(state.cpu_limit)}")
+        gc = self.config.get("backend-gc", "auto")
+        if gc == "auto":
+            gc = "zgc" if heap_size >= BACKEND_ZGC_MIN_HEAP_MIB else "g1"
+        options.append("-XX:+UseZGC" if gc == "zgc" else "-XX:+UseG1GC")
+        if self.config.get("backend-aot-cache", True) and gc != "zgc":
+            options.append(f"-XX:AOTCache={BACKEND_AOT_CACHE}")
+        options.append(f"-Xlog:gc*:file={BACKEND_GC_LOG}:time,uptime:filecount=5,filesize=10m")
+        executor_threads = int(self.config.get("backend-executor-threads", 0))
+        if not executor_threads and state.cpu_limit:
+            executor_threads = math.ceil(state.cpu_limit)
+        if executor_threads:
+            # the backend runs the requests on virtual threads, carried by the fork-join pools
+            options.append(f"-Djdk.virtualThreadScheduler.parallelism={executor_threads}")
+            options.append(
+                f"-Djava.util.concurrent.ForkJoinPool.common.parallelism={executor_threads}"
+            )
+        options.extend(str(self.config.get("backend-jvm-options", "")).split())
+        return options
+
+    def _get_penpot_backend_http_threads(self, state: CharmState) -> dict[str, str]:
+        """Retrieve the number of IO threads of the penpot backend HTTP server.
+
+        The IO threads accept the connections and parse the requests before handing them
+        to the executor, so they default to the container CPU limit, with the minimum of
+        3 the backend uses itself.
+
+        Args:
+            state: Charm state snapshot.
+
+        Returns:
+            Penpot backend HTTP server environment variables, empty to keep penpot defaults.
+        """
+        io_threads = int(self.config.get("backend-io-threads", 0))
+        if not io_threads and state.cpu_limit:
+            io_threads = max(3, math.ceil(state.cpu_limit))
+        if not io_threads:
+            return {}
+        return {"PENPOT_HTTP_SERVER_IO_THREADS": str(io_threads)}
+
+    @tracer.start_as_current_span("get cluster dns")
+    def _get_cluster_dns(self) -> tuple[str, str]:
+        """Retrieve the Kubernetes cluster domain and nameserver shared by all units.
+
+        The leader discovers both values and stores them in the peer integration, where
+        they are reused by every unit. The leader checks them again once they were last
+        checked more than CLUSTER_DNS_TTL ago, and only writes them when they changed.
+        A failed lookup keeps the stored values and is retried on the next reconcile.
+        While nothing is stored yet, units run the discovery themselves, and fall back to
+        the nameserver of the pod, without sharing it, when it fails.
+
+        Returns:
+            Kubernetes cluster domain name and nameserver address.
+        """
+        relation = self.model.get_relation("penpot_peer")
+        data = relation.data[self.app] if relation else {}
+        cluster_domain = data.get("cluster-domain")
+        internal_resolver = data.get("internal-resolver")
+        checked_at = typing.cast(float, self._stored.cluster_dns_checked_at)
+        expired = time.time() - checked_at > CLUSTER_DNS_TTL
+        if cluster_domain and internal_resolver and not (expired and self.unit.is_leader()):
+            return cluster_domain, internal_resolver
+        discovered = self._discover_cluster_dns()
+        if discovered:
+            self._store_cluster_dns(discovered)
+            return discovered
+        if cluster_domain and internal_resolver:
+            return cluster_domain, internal_resolver
+        import dns.resolver  # pylint: disable=import-outside-toplevel
+
+        return "cluster.local", typing.cast(str, dns.resolver.Resolver().nameservers[0])
+
+    def _discover_cluster_dns(self) -> tuple[str, str] | None:
+        """Discover the Kubernetes cluster domain and nameserver.
+
+        Returns:
+            Kubernetes cluster domain name and nameserver address, None if a lookup failed.
+        """
+        cluster_domain = self._get_kubernetes_cluster_domain()
+        if not cluster_domain:
+            return None
+        internal_resolver = self._get_local_resolver(cluster_domain)
+        if not internal_resolver:
+            return None
+        return cluster_domain, internal_resolver
+
+    def _store_cluster_dns(self, cluster_dns: tuple[str, str]) -> None:
+        """Share the discovered cluster DNS settings with all units, when run by the leader.
+
+        The peer integration is only written when the settings changed, since every write
+        runs a reconcile on every unit.
+
+        Args:
+            cluster_dns: Kubernetes cluster domain name and nameserver address.
+        """
+        relation = self.model.get_relation("penpot_peer")
+        if not relation or not self.unit.is_leader():
+            return
+        self._stored.cluster_dns_checked_at = time.time()
+        cluster_domain, internal_resolver = cluster_dns
+        data = relation.data[self.app]
+        if (data.get("cluster-domain"), data.get("internal-resolver")) != cluster_dns:
+            data.update({"cluster-domain": cluster_domain, "internal-resolver": internal_resolver})
+
+    @tracer.start_as_current_span("resolve kube-dns")
+    def _get_local_resolver(self, cluster_domain: str) -> str | None:
+        """Retrieve the address of the cluster nameserver.
+
+        Args:
+            cluster_domain: Kubernetes cluster domain name.
+
+        Returns:
+            The address of the nameserver, None if it can't be resolved.
+        """
+        import dns.resolver  # pylint: disable=import-outside-toplevel
+
+        kube_dns = f"kube-dns.kube-system.svc.{cluster_domain}"
         try:
             dns.resolver.resolve(kube_dns, search=True)
-            return kube_dns
         except dns.exception.DNSException:
-            # resolvers like dns-over-https, not likely to happen in Kubernetes
-            return typing.cast(str, dns.resolver.Resolver().nameservers[0])
+            logger.warning("failed to resolve %s", kube_dns)
+            return None
+        return kube_dns
+
+    def _get_penpot_internal_resolver(self, state: CharmState) -> str:
+        """Retrieve the resolver of the penpot frontend nginx, with its caching parameters.
+
+        The nginx resolver directive of the penpot rock takes the whole value, so the
+        parameters follow the nameserver address. Nginx caches the answers for the
+        object storage and exporter hostnames for frontend-dns-cache-ttl seconds instead
+        of the record TTLs.
+
+        Args:
+            state: Charm state snapshot.
+
+        Returns:
+            Nginx resolver address and parameters.
+        """
+        resolver = [state.internal_resolver]
+        cache_ttl = int(self.config.get("frontend-dns-cache-ttl", 0))
+        if cache_ttl:
+            resolver.append(f"valid={cache_ttl}s")
+        if not self.config.get("frontend-dns-ipv6", True):
+            resolver.append("ipv6=off")
+        return " ".join(resolver)
+
+    def _get_penpot_units(self) -> list[str]:
+        """Retrieve the names of the penpot units, from the lowest unit number.
+
+        Returns:
+            Penpot unit names.
+        """
+        relation = typing.cast(ops.Relation, self.model.get_relation("penpot_peer"))
+        units = list(relation.units)
+        units.append(self.unit)
+        return [u.name for u in sorted(units, key=lambda u: int(u.name.split("/")[-1]))]
 
     def _get_penpot_exporter_unit(self) -> str:
         """Retrieve the name of the unit designated to run the penpot exporter.
@@ -460,35 +1338,186 @@ class PenpotCharm(ops.CharmBase):
         Returns:
             Exporter unit name.
         """
+        return self._get_penpot_units()[0]
+
+    def _get_penpot_unit_role(self) -> str:
+        """Retrieve the role of this unit.
+
+        With worker-units set, the units with the lowest numbers are dedicated to the
+        background worker and the others serve the API only, unless there are not enough
+        units left for both roles.
+
+        Returns:
+            `worker`, `api`, or `all` when this unit has both roles.
+        """
+        worker_units = int(self.config.get("worker-units", 0))
+        if not worker_units:
+            return "all"
+        units = self._get_penpot_units()
+        if worker_units >= len(units):
+            return "all"
+        return "worker" if self.unit.name in units[:worker_units] else "api"
+
+    def _get_penpot_api_backends(self) -> list[str]:
+        """Retrieve the backend addresses the frontend of a worker unit sends the API calls to.
+
+        Worker units still receive traffic from the ingress, which their frontend forwards
+        to the backends of the API units, so their own backend only runs the background
+        worker. The units are addressed by the pod IP address they publish on the peer
+        relation, updated when their pod is recreated, and left out until they publish it.
+
+        Returns:
+            Backend addresses of the API units on a worker unit, empty otherwise.
+        """
+        if self._get_penpot_unit_role() != "worker":
+            return []
+        worker_units = int(self.config.get("worker-units", 0))
+        api_units = self._get_penpot_units()[worker_units:]
         relation = typing.cast(ops.Relation, self.model.get_relation("penpot_peer"))
-        units = list(relation.units)
-        units.append(self.unit)
-        return sorted(units, key=lambda u: int(u.name.split("/")[-1]))[0].name
+        addresses = (
+            relation.data[unit].get("ingress-address")
+            for unit in sorted(relation.units, key=lambda u: int(u.name.split("/")[-1]))
+            if unit.name in api_units
+        )
+        return [f"{address}:6060" for address in addresses if address]
+
+    def _get_penpot_unit_hostname(self, unit_name: str, state: CharmState) -> str:
+        """Retrieve the hostname of a penpot unit in the cluster.
 
-    def _get_penpot_exporter_uri(self) -> str:
-        """Retrieve the address of the unit designated to run the penpot exporter.
+        Args:
+            unit_name: Penpot unit name.
+            state: Charm state snapshot.
+
+        Returns:
+            Hostname of the unit pod on the headless service of the application.
+        """
+        pod_name = unit_name.replace("/", "-")
+        k8s_domain = state.cluster_domain
+        return f"{pod_name}.{self.app.name}-endpoints.{self.model.name}.svc.{k8s_domain}"
+
+    def _runs_penpot_exporter(self) -> bool:
+        """Check if this unit runs the penpot exporter.
+
+        Returns:
+            True if every unit runs the exporter or this is the designated exporter unit.
+        """
+        if self.config.get("exporter-mode") == "pool":
+            return True
+        return self.unit.name == self._get_penpot_exporter_unit()
+
+    def _get_penpot_exporter_uri(self, state: CharmState) -> str:
+        """Retrieve the address of the penpot exporter used by this unit's frontend.
+
+        In pool mode, every unit runs the exporter and the frontend uses the local one,
+        so the exports are spread over the units the same way the ingress spreads the
+        requests. Otherwise, all frontends use the designated exporter unit.
+
+        Args:
+            state: Charm state snapshot.
 
         Returns:
-            Exporter unit address.
+            Exporter address.
         """
-        unit_name = self._get_penpot_exporter_unit().replace("/", "-")
-        k8s_domain = self._get_kubernetes_cluster_domain()
-        hostname = f"{unit_name}.{self.app.name}-endpoints.{self.model.name}.svc.{k8s_domain}"
+        if self.config.get("exporter-mode") == "pool":
+            return "http://127.0.0.1:6061"
+        hostname = self._get_penpot_unit_hostname(self._get_penpot_exporter_unit(), state)
         return f"http://{hostname}:6061"
 
-    def _get_kubernetes_cluster_domain(self) -> str:
+    def _get_penpot_exporter_limits(self, state: CharmState) -> dict[str, str]:
+        """Retrieve the browser pool size and Node.js heap size of the penpot exporter.
+
+        Options left to zero are derived from the penpot container memory limit. A quarter
+        of it is budgeted for the exporter, of which a quarter goes to the Node.js heap and
+        the rest to the browsers. Without a memory limit, the exporter defaults are kept.
+
+        Args:
+            state: Charm state snapshot.
+
+        Returns:
+            Penpot exporter environment variables.
+        """
+        pool_size = int(self.config.get("exporter-browser-pool-size", 0))
+        heap_size = int(self.config.get("exporter-max-heap-size", 0))
+        if state.memory_limit:
+            budget = int(state.memory_limit * EXPORTER_MEMORY_SHARE) // 2**20
+            heap_size = heap_size or min(max(budget // 4, 128), 2048)
+            pool_size = pool_size or max(1, (budget - heap_size) // EXPORTER_BROWSER_MEMORY_MIB)
+        limits = {}
+        if pool_size:
+            limits["PENPOT_BROWSER_POOL_MAX"] = str(pool_size)
+        if heap_size:
+            limits["NODE_OPTIONS"] = f"--max-old-space-size={heap_size}"
+        return limits
+
+    @tracer.start_as_current_span("get container memory limit")
+    def _get_container_memory_limit(self) -> int | None:
+        """Get the memory limit of the penpot container from its cgroup.
+
+        Returns:
+            Memory limit in bytes, None if the container is unlimited or unreachable.
+        """
+        for path in CGROUP_MEMORY_LIMIT_FILES:
+            content = self._read_container_file(path)
+            if content is None:
+                continue
+            # cgroup v1 reports an unlimited container with a limit close to the max int64
+            if not content.isdigit() or int(content) >= 2**62:
+                return None
+            return int(content)
+        return None
+
+    @tracer.start_as_current_span("get container cpu limit")
+    def _get_container_cpu_limit(self) -> float | None:
+        """Get the CPU limit of the penpot container from its cgroup.
+
+        Returns:
+            CPU limit in cores, None if the container is unlimited or unreachable.
+        """
+        content = self._read_container_file(CGROUP_CPU_MAX_FILE)
+        if content is not None:
+            quota, _, period = content.partition(" ")
+        else:
+            quota, period = (
+                self._read_container_file(path) or "" for path in CGROUP_CPU_QUOTA_FILES
+            )
+        # the quota is "max" with cgroup v2 and -1 with cgroup v1 when unlimited
+        if not quota.isdigit() or not period.isdigit() or not int(period):
+            return None
+        return int(quota) / int(period)
+
+    def _read_container_file(self, path: str) -> str | None:
+        """Read a small text file from the penpot container.
+
+        Args:
+            path: Path of the file in the penpot container.
+
+        Returns:
+            File content without surrounding whitespace, None if it can't be read.
+        """
+        if not self.container.can_connect():
+            return None
+        try:
+            return self.container.pull(path).read().strip()
+        except (ops.pebble.PathError, ops.pebble.APIError):
+            return None
+
+    @tracer.start_as_current_span("resolve kubernetes cluster domain")
+    def _get_kubernetes_cluster_domain(self) -> str | None:
         """Get Kubernetes cluster domain name.
 
         Returns:
-            Kubernetes cluster domain name.
+            Kubernetes cluster domain name, None if it can't be resolved.
         """
+        import dns.resolver  # pylint: disable=import-outside-toplevel
+
         try:
             answers = dns.resolver.resolve("kubernetes.default.svc", search=True)
         except dns.exception.DNSException:
-            return "cluster.local"
+            logger.warning("failed to resolve kubernetes.default.svc")
+            return None
         return answers.qname.to_text().removeprefix("kubernetes.default.svc").strip(".")
 
-    def _get_oauth(self) -> OAuthRequirer | None:
+    def _get_oauth(self) -> "OAuthRequirer | None":
         """Retrieve the OAuthRequirer object if available.
 
         Returns:
@@ -499,10 +1528,12 @@ class PenpotCharm(ops.CharmBase):
         client_config = self._get_oauth_client_config()
         if not client_config:
             return None
+        from charms.hydra.v0.oauth import OAuthRequirer  # pylint: disable=import-outside-toplevel
+
         self.oauth = OAuthRequirer(self, client_config=client_config)
         return self.oauth
 
-    def _get_oauth_client_config(self) -> ClientConfig | None:
+    def _get_oauth_client_config(self) -> "ClientConfig | None":
         """Retrieve the oauth ClientConfig object for the oauth charm library if available.
 
         Returns:
@@ -511,6 +1542,8 @@ class PenpotCharm(ops.CharmBase):
         public_uri = self._get_public_uri()
         if not public_uri:
             return None
+        from charms.hydra.v0.oauth import ClientConfig  # pylint: disable=import-outside-toplevel
+
         return ClientConfig(
             urllib.parse.urljoin(public_uri, "/api/auth/oidc/callback"),
             scope="openid profile email",
@@ -519,6 +1552,7 @@ class PenpotCharm(ops.CharmBase):
             token_endpoint_auth_method="client_secret_post",  # nosec  # noqa: S106
         )
 
+    @tracer.start_as_current_span("get oauth configuration")
     def _get_penpot_oauth_config(self) -> dict[str, str]:
         """Retrieve oauth-related configurations for penpot.
 
@@ -546,5 +1580,33 @@ class PenpotCharm(ops.CharmBase):
         }
 
 
+def _service_definition(service: ops.pebble.Service) -> dict[str, typing.Any]:
+    """Get the parts of a pebble service definition that affect the running process.
+
+    Args:
+        service: Pebble service.
+
+    Returns:
+        Service definition without the layer override policy.
+    """
+    definition = dict(service.to_dict())
+    definition.pop("override", None)
+    return definition
+
+
+def _plan_fingerprint(layer: ops.pebble.LayerDict, services: list[str]) -> str:
+    """Get a digest identifying a pebble layer and the services running from it.
+
+    Args:
+        layer: Penpot pebble layer.
+        services: Names of the services that should be running on this unit.
+
+    Returns:
+        Hex digest of the layer and service names.
+    """
+    content = json.dumps({"layer": layer, "services": sorted(services)}, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
 if __name__ == "__main__":  # pragma: nocover
     ops.main.main(PenpotCharm)
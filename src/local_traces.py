@@ -0,0 +1,116 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Reading of the charm trace data buffered in the unit by ops-tracing.
+
+ops-tracing buffers the spans of every dispatch in an sqlite database in the charm
+directory as OTLP JSON chunks, and removes them once they're sent to the charm-tracing
+integration. Without that integration, the buffer keeps the most recent spans.
+
+The buffer isn't a public interface of ops-tracing, so its schema is checked against the
+one of the ops-tracing version the charm pins before reading it.
+"""
+
+import contextlib
+import json
+import logging
+import pathlib
+import sqlite3
+import typing
+
+logger = logging.getLogger(__name__)
+
+# same as ops_tracing._backend.BUFFER_FILENAME, not imported to keep the action light
+TRACES_FILENAME = ".tracing-data.db"
+OTLP_JSON_MIME = "application/json"
+# columns of the tracing table of the ops-tracing 3.7 buffer
+TRACES_COLUMNS = ("id", "priority", "data", "mime")
+STATUS_CODES = {0: "UNSET", 1: "OK", 2: "ERROR"}
+
+
+def read_traces(path: pathlib.Path, lines: int) -> list[str]:
+    """Read the most recent spans stored in the ops-tracing buffer.
+
+    Args:
+        path: Path of the ops-tracing buffer.
+        lines: Maximum number of spans to return.
+
+    Returns:
+        JSON encoded spans, oldest first.
+
+    Raises:
+        ValueError: If the buffer schema isn't the expected one.
+    """
+    if lines <= 0 or not path.exists():
+        return []
+    try:
+        with contextlib.closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+            columns = tuple(row[1] for row in conn.execute("PRAGMA table_info(tracing)"))
+            if columns != TRACES_COLUMNS:
+                raise ValueError(
+                    f"unsupported ops-tracing buffer schema, tracing columns: {columns}"
+                )
+            rows = conn.execute(
+                "SELECT data FROM tracing WHERE mime = ? ORDER BY id", (OTLP_JSON_MIME,)
+            ).fetchall()
+    except sqlite3.Error:
+        logger.exception("failed to read trace data from %s", path)
+        return []
+    spans = [span for (data,) in rows for span in _otlp_spans(json.loads(data))]
+    spans.sort(key=lambda span: int(span["endTimeUnixNano"]))
+    return [json.dumps(_span_to_dict(span)) for span in spans[-lines:]]
+
+
+def _otlp_spans(chunk: dict[str, typing.Any]) -> typing.Iterator[dict[str, typing.Any]]:
+    """Iterate over the spans of an OTLP JSON chunk.
+
+    Args:
+        chunk: Decoded OTLP JSON export request.
+
+    Yields:
+        OTLP JSON spans.
+    """
+    for resource_spans in chunk.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            yield from scope_spans.get("spans", [])
+
+
+def _span_to_dict(span: dict[str, typing.Any]) -> dict[str, typing.Any]:
+    """Convert an OTLP JSON span to a compact dictionary.
+
+    Args:
+        span: OTLP JSON span.
+
+    Returns:
+        Span name, identifiers, timing in milliseconds, status and attributes.
+    """
+    start, end = int(span["startTimeUnixNano"]), int(span["endTimeUnixNano"])
+    return {
+        "name": span["name"],
+        "trace_id": span["traceId"],
+        "span_id": span["spanId"],
+        "parent_id": span.get("parentSpanId"),
+        "start_ms": start // 1_000_000,
+        "duration_ms": round((end - start) / 1_000_000, 3),
+        "status": STATUS_CODES.get(span.get("status", {}).get("code", 0), "UNSET"),
+        "attributes": {
+            attribute["key"]: _attribute_value(attribute["value"])
+            for attribute in span.get("attributes", [])
+        },
+    }
+
+
+def _attribute_value(value: dict[str, typing.Any]) -> typing.Any:
+    """Convert an OTLP JSON attribute value to a plain value.
+
+    Args:
+        value: OTLP JSON attribute value, like ``{"stringValue": "backend"}``.
+
+    Returns:
+        JSON serializable value.
+    """
+    if "arrayValue" in value:
+        return [_attribute_value(item) for item in value["arrayValue"].get("values", [])]
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
@@ -0,0 +1,281 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Penpot frontend nginx configuration managed by the charm.
+
+The nginx configuration template of the penpot rock includes the files of the
+/etc/nginx/overrides/main.d directory in its main context, the files of the
+/etc/nginx/overrides/events.d directory in its events block, the files of the
+/etc/nginx/overrides/http.d directory in its http block and the files of the
+/etc/nginx/overrides/server.d directory in its server block, before the catch-all
+location serving the frontend.
+"""
+
+import typing
+
+MAIN_CONFIG_FILE = "/etc/nginx/overrides/main.d/penpot-charm.conf"
+EVENTS_CONFIG_FILE = "/etc/nginx/overrides/events.d/penpot-charm.conf"
+HTTP_CONFIG_FILE = "/etc/nginx/overrides/http.d/penpot-charm.conf"
+SERVER_CONFIG_FILE = "/etc/nginx/overrides/server.d/penpot-charm.conf"
+
+# directories of the frontend static assets, referenced with a version query argument
+STATIC_DIRS = ("js", "css", "fonts", "images")
+# browser cache lifetime, in seconds, of the entry points referencing the static assets
+ENTRYPOINT_MAX_AGE = 60
+# cache of the assets fetched from the object storage, in the container ephemeral storage
+ASSET_CACHE_DIR = "/var/lib/nginx/penpot-asset-cache"
+
+# every proxied connection holds a client and an upstream file descriptor
+_MAIN_CONFIG = """\
+worker_processes {worker_processes};
+worker_rlimit_nofile {rlimit_nofile};
+"""
+
+_EVENTS_CONFIG = """\
+worker_connections {worker_connections};
+"""
+
+_HTTP_CONFIG = """\
+# static assets referenced with a version argument change URL with every penpot release
+map $arg_version $penpot_static_cache_control {
+    "" "public, max-age=3600";
+    default "public, max-age=31536000, immutable";
+}
+"""
+
+_SERVER_CONFIG = """\
+sendfile on;
+tcp_nopush on;
+open_file_cache max=4096 inactive=5m;
+open_file_cache_valid 1m;
+open_file_cache_min_uses 2;
+open_file_cache_errors on;
+
+location = / {{
+    etag on;
+    add_header Cache-Control "public, max-age={entrypoint_max_age}" always;
+    try_files /index.html =404;
+}}
+
+location = /index.html {{
+    etag on;
+    add_header Cache-Control "public, max-age={entrypoint_max_age}" always;
+}}
+
+location = /js/config.js {{
+    etag on;
+    add_header Cache-Control "public, max-age={entrypoint_max_age}" always;
+}}
+{static_locations}{asset_cache_locations}{upstream_locations}"""
+
+_STATIC_LOCATION = """
+location ^~ /{directory}/ {{
+    etag on;
+    add_header Cache-Control $penpot_static_cache_control always;
+    try_files $uri =404;
+}}
+"""
+
+_ASSET_CACHE_PATH = """
+proxy_cache_path {path} levels=1:2 keys_zone=penpot_assets:{keys_zone}m max_size={size}m
+    inactive=30d use_temp_path=off;
+"""
+
+# The backend answers the asset requests with a redirect to a presigned object storage URL,
+# which the upstream template follows in its @handle_redirect location. These locations
+# take precedence for the asset URLs and follow the redirect through the cache, keyed by
+# the asset URL since the presigned query string differs for every request.
+_ASSET_CACHE_LOCATIONS = """
+location ^~ /assets/by- {
+    proxy_pass http://127.0.0.1:6060;
+    recursive_error_pages on;
+    proxy_intercept_errors on;
+    error_page 301 302 307 = @penpot_cached_asset;
+}
+
+location @penpot_cached_asset {
+    set $redirect_uri "$upstream_http_location";
+    set $redirect_host "$upstream_http_x_host";
+    proxy_set_header Host "$redirect_host";
+    proxy_pass $redirect_uri;
+    proxy_cache penpot_assets;
+    proxy_cache_key $uri;
+    proxy_cache_valid 200 30d;
+    proxy_cache_lock on;
+    proxy_cache_use_stale error timeout updating;
+    proxy_ignore_headers Cache-Control Expires Set-Cookie;
+    proxy_hide_header etag;
+    proxy_hide_header x-amz-id-2;
+    proxy_hide_header x-amz-request-id;
+    proxy_hide_header x-amz-meta-server-side-encryption;
+    proxy_hide_header x-amz-server-side-encryption;
+    add_header Cache-Control "public, max-age=604800" always;
+    add_header X-Cache-Status $upstream_cache_status always;
+}
+"""
+
+# Node.js closes idle keepalive connections after 5 seconds, nginx must close them first
+EXPORTER_KEEPALIVE_TIMEOUT = 4
+
+_UPSTREAM = """
+upstream {name} {{
+    server {server};
+    keepalive {keepalive};
+    keepalive_requests {keepalive_requests};
+    keepalive_timeout {keepalive_timeout}s;
+}}
+"""
+
+# The locations of the upstream template proxy to the backend and exporter addresses
+# directly, opening a connection per request. These locations take precedence for the RPC
+# calls and the exports and reuse the connections of the upstream pools, which requires
+# HTTP/1.1 without the Connection header nginx sends by default.
+_UPSTREAM_LOCATION = """
+location {location} {{
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $http_host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+    proxy_pass http://{name};
+}}
+"""
+
+# backend failures after which nginx stops sending requests to an API unit, for the
+# number of seconds of the failure window
+API_MAX_FAILS = 3
+API_FAIL_TIMEOUT = 10
+
+# On a worker unit, the frontend forwards the API calls and the notifications websocket
+# the ingress sends it to the backends of the API units, spread with round robin, so its
+# own backend only runs the background tasks. nginx takes a failing backend out of the
+# rotation for a while, and retries the request on the next backend when it can't connect
+# or times out, which it only does for idempotent requests.
+_API_UPSTREAM = """
+upstream penpot_api {{
+{servers}{keepalive}}}
+"""
+
+_API_LOCATIONS = """
+location ^~ /api/ {
+    proxy_next_upstream error timeout;
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $http_host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+    proxy_pass http://penpot_api;
+}
+
+location ^~ /ws/ {
+    proxy_next_upstream error timeout;
+    proxy_http_version 1.1;
+    proxy_set_header Upgrade $http_upgrade;
+    proxy_set_header Connection "upgrade";
+    proxy_set_header Host $http_host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+    proxy_pass http://penpot_api;
+}
+"""
+
+
+def generate_config(  # pylint: disable=too-many-arguments
+    *,
+    worker_processes: int | None = None,
+    worker_connections: int = 8192,
+    asset_cache_size: int = 0,
+    upstream_keepalive: int = 0,
+    upstream_keepalive_requests: int = 1000,
+    upstream_keepalive_timeout: int = 60,
+    local_exporter: bool = False,
+    api_backends: typing.Sequence[str] = (),
+) -> dict[str, str]:
+    """Generate the nginx configuration files managed by the charm.
+
+    Args:
+        worker_processes: Number of nginx worker processes, None for one per CPU.
+        worker_connections: Maximum number of connections of each nginx worker.
+        asset_cache_size: Size in MiB of the cache of the assets fetched from the object
+            storage, 0 to disable it.
+        upstream_keepalive: Number of idle connections to the backend and the exporter
+            each nginx worker keeps open, 0 to open a connection per request.
+        upstream_keepalive_requests: Number of requests after which a connection to the
+            backend or the exporter is closed.
+        upstream_keepalive_timeout: Time in seconds after which an idle connection to the
+            backend is closed.
+        local_exporter: Whether the frontend sends the exports to the exporter of its
+            own unit, the only one the connections are kept open to.
+        api_backends: Backend IP addresses and ports of the API units, which the API
+            calls are forwarded to instead of the backend of this unit, on a worker unit.
+            nginx resolves the upstream server names once when it loads the configuration,
+            so they are addresses rather than pod hostnames.
+
+    Returns:
+        Content of the nginx configuration files, indexed by their path.
+    """
+    http_config = _HTTP_CONFIG
+    static_locations = "".join(
+        _STATIC_LOCATION.format(directory=directory) for directory in STATIC_DIRS
+    )
+    asset_cache_locations = ""
+    if asset_cache_size:
+        # a megabyte of keys zone holds about 8000 keys, enough for 128 MiB of thumbnails
+        http_config += _ASSET_CACHE_PATH.format(
+            path=ASSET_CACHE_DIR,
+            keys_zone=max(1, asset_cache_size // 128),
+            size=asset_cache_size,
+        )
+        asset_cache_locations = _ASSET_CACHE_LOCATIONS
+    upstream_locations = ""
+    if api_backends:
+        http_config += _API_UPSTREAM.format(
+            servers="".join(
+                f"    server {backend} max_fails={API_MAX_FAILS}"
+                f" fail_timeout={API_FAIL_TIMEOUT}s;\n"
+                for backend in api_backends
+            ),
+            keepalive=(
+                f"    keepalive {upstream_keepalive};\n"
+                f"    keepalive_requests {upstream_keepalive_requests};\n"
+                f"    keepalive_timeout {upstream_keepalive_timeout}s;\n"
+                if upstream_keepalive
+                else ""
+            ),
+        )
+        upstream_locations += _API_LOCATIONS
+    if upstream_keepalive:
+        upstreams = []
+        if not api_backends:
+            upstreams.append(("penpot_backend", "127.0.0.1:6060", "^~ /api/rpc/"))
+        if local_exporter:
+            upstreams.append(("penpot_exporter", "127.0.0.1:6061", "= /api/export"))
+        for name, server, location in upstreams:
+            http_config += _UPSTREAM.format(
+                name=name,
+                server=server,
+                keepalive=upstream_keepalive,
+                keepalive_requests=upstream_keepalive_requests,
+                keepalive_timeout=(
+                    min(upstream_keepalive_timeout, EXPORTER_KEEPALIVE_TIMEOUT)
+                    if name == "penpot_exporter"
+                    else upstream_keepalive_timeout
+                ),
+            )
+            upstream_locations += _UPSTREAM_LOCATION.format(location=location, name=name)
+    return {
+        MAIN_CONFIG_FILE: _MAIN_CONFIG.format(
+            worker_processes=worker_processes or "auto", rlimit_nofile=2 * worker_connections
+        ),
+        EVENTS_CONFIG_FILE: _EVENTS_CONFIG.format(worker_connections=worker_connections),
+        HTTP_CONFIG_FILE: http_config,
+        SERVER_CONFIG_FILE: _SERVER_CONFIG.format(
+            entrypoint_max_age=ENTRYPOINT_MAX_AGE,
+            static_locations=static_locations,
+            asset_cache_locations=asset_cache_locations,
+            upstream_locations=upstream_locations,
+        ),
+    }
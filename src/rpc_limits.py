@@ -0,0 +1,149 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Penpot backend RPC limits configuration managed by the charm.
+
+The penpot backend reads the rate limits (rlimit) and the concurrency limits (climit) of
+its RPC methods from EDN files, used when the rpc-rlimit and rpc-climit flags are enabled.
+The backend reloads the rate limits file when it changes, while it only reads the
+concurrency limits file at startup. The penpot rock keeps a copy of the penpot default
+concurrency limits, which the charm merges with the configured ones.
+"""
+
+import json
+import re
+import typing
+
+import yaml
+
+RLIMIT_CONFIG_FILE = "/opt/penpot/backend/rlimit.edn"
+CLIMIT_CONFIG_FILE = "/opt/penpot/backend/climit.edn"
+# penpot default concurrency limits, copied from the penpot sources by the penpot rock
+CLIMIT_DEFAULTS_FILE = "/opt/penpot/backend/climit.defaults.edn"
+
+# format of the limit of each rate limit strategy: requests per time window, and bucket
+# capacity, refilled tokens and refill interval
+RLIMIT_STRATEGIES = {
+    "window": re.compile(r"\d+/[smhd]"),
+    "bucket": re.compile(r"\d+/\d+/\d+[smhd]"),
+}
+
+_NAME = re.compile(r"[a-z][a-z0-9-]*")
+_LIMITER_NAME = re.compile(r"[a-z][a-z0-9-]*(/[a-z][a-z0-9-]*)?")
+# limiter entry of a climit EDN file, a limiter keyword and its flat map of options
+_CLIMIT_ENTRY = re.compile(r":([a-z][a-z0-9-]*(?:/[a-z][a-z0-9-]*)?)\s*(\{[^{}]*\})")
+_EDN_COMMENT = re.compile(r";[^\n]*")
+
+
+def _load(definitions: str, option: str) -> dict[str, typing.Any]:
+    """Load limit definitions written in YAML.
+
+    Args:
+        definitions: YAML mapping of the limit definitions.
+        option: Name of the configuration option holding the definitions.
+
+    Returns:
+        Limit definitions.
+
+    Raises:
+        ValueError: If the definitions are not a YAML mapping.
+    """
+    try:
+        data = yaml.safe_load(definitions)
+    except yaml.YAMLError as exc:
+        raise ValueError(f"invalid {option}: not valid YAML") from exc
+    if not isinstance(data, dict):
+        raise ValueError(f"invalid {option}: must be a mapping")
+    return data
+
+
+def generate_rlimit_config(definitions: str) -> str:
+    """Generate the rate limits file of the penpot RPC methods.
+
+    Args:
+        definitions: YAML mapping of the RPC method names, or `default` for every method,
+            to their list of limits, like `{name: burst, strategy: bucket, limit: 5/5/5s}`.
+
+    Returns:
+        EDN content of the rate limits file.
+
+    Raises:
+        ValueError: If the definitions are invalid.
+    """
+    entries = []
+    for method, limits in _load(definitions, "rpc-rate-limits").items():
+        if not isinstance(method, str) or not _NAME.fullmatch(method):
+            raise ValueError(f"invalid rpc-rate-limits: invalid method {method}")
+        if not isinstance(limits, list) or not limits:
+            raise ValueError(f"invalid rpc-rate-limits: {method} must be a list of limits")
+        rendered = []
+        for limit in limits:
+            if not isinstance(limit, dict) or set(limit) != {"name", "strategy", "limit"}:
+                raise ValueError(
+                    f"invalid rpc-rate-limits: {method} limits need a name, strategy and limit"
+                )
+            name, strategy, value = limit["name"], limit["strategy"], str(limit["limit"])
+            if not isinstance(name, str) or not _NAME.fullmatch(name):
+                raise ValueError(f"invalid rpc-rate-limits: invalid limit name {name}")
+            if strategy not in RLIMIT_STRATEGIES:
+                raise ValueError(f"invalid rpc-rate-limits: unknown strategy {strategy}")
+            if not RLIMIT_STRATEGIES[strategy].fullmatch(value):
+                raise ValueError(f"invalid rpc-rate-limits: invalid {strategy} limit {value}")
+            rendered.append(f"[:{name} :{strategy} {json.dumps(value)}]")
+        key = ":default" if method == "default" else f"#{{:command/{method}}}"
+        entries.append(f"{key} [{' '.join(rendered)}]")
+    return "{" + "\n ".join(entries) + "}\n"
+
+
+def _parse_climit_entries(content: str) -> dict[str, str]:
+    """Parse the limiters of a penpot concurrency limits file.
+
+    Args:
+        content: EDN content of the concurrency limits file.
+
+    Returns:
+        Limiter names mapped to their EDN options, in the order of the file.
+    """
+    return {
+        limiter: " ".join(options.split())
+        for limiter, options in _CLIMIT_ENTRY.findall(_EDN_COMMENT.sub("", content))
+    }
+
+
+def generate_climit_config(definitions: str, defaults: str = "") -> str:
+    """Generate the concurrency limits file of the penpot RPC methods.
+
+    Args:
+        definitions: YAML mapping of the penpot concurrency limiter names, like
+            `process-image/global`, to their number of permits and, optionally, the
+            number of calls waiting for a permit before the next ones are rejected.
+        defaults: EDN content of the penpot default concurrency limits file. The file
+            replaces the penpot default one, so the default limiters left out of the
+            definitions are kept from it.
+
+    Returns:
+        EDN content of the concurrency limits file.
+
+    Raises:
+        ValueError: If the definitions are invalid.
+    """
+    limiters = _parse_climit_entries(defaults)
+    for limiter, limit in _load(definitions, "rpc-concurrency-limits").items():
+        if not isinstance(limiter, str) or not _LIMITER_NAME.fullmatch(limiter):
+            raise ValueError(f"invalid rpc-concurrency-limits: invalid limiter {limiter}")
+        if not isinstance(limit, dict) or not set(limit) <= {"permits", "queue"}:
+            raise ValueError(
+                f"invalid rpc-concurrency-limits: {limiter} accepts only permits and queue"
+            )
+        # YAML booleans are ints in Python, reject them explicitly
+        permits = limit.get("permits")
+        if not isinstance(permits, int) or isinstance(permits, bool) or permits < 1:
+            raise ValueError(f"invalid rpc-concurrency-limits: {limiter} needs permits")
+        rendered = f":permits {permits}"
+        if "queue" in limit:
+            queue = limit["queue"]
+            if not isinstance(queue, int) or isinstance(queue, bool) or queue < 0:
+                raise ValueError(f"invalid rpc-concurrency-limits: invalid {limiter} queue")
+            rendered += f" :queue {queue}"
+        limiters[limiter] = f"{{{rendered}}}"
+    return "{" + "\n ".join(f":{name} {options}" for name, options in limiters.items()) + "}\n"
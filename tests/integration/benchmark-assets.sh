@@ -0,0 +1,57 @@
+#!/usr/bin/env bash
+
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+# Measure the asset write and read latency of a deployed penpot, to compare the s3 and
+# filesystem values of the asset-storage configuration option.
+#
+# Run it once against a deployment of each storage. Every run uploads the image as a new
+# media object of a new file, then downloads each uploaded asset through the penpot
+# frontend, which follows the redirect to the object storage with the s3 storage and reads
+# the asset from the assets storage with the filesystem storage.
+#
+# Usage: ./benchmark-assets.sh <penpot URL> <email> <password> <image> [runs]
+
+set -euo pipefail
+
+URL=${1:?usage: $0 <penpot URL> <email> <password> <image> [runs]}
+EMAIL=${2:?usage: $0 <penpot URL> <email> <password> <image> [runs]}
+PASSWORD=${3:?usage: $0 <penpot URL> <email> <password> <image> [runs]}
+IMAGE=${4:?usage: $0 <penpot URL> <email> <password> <image> [runs]}
+RUNS=${5:-20}
+
+WORKDIR=$(mktemp -d)
+trap 'rm -rf "$WORKDIR"' EXIT
+COOKIES="$WORKDIR/cookies"
+
+rpc() {
+  local command=$1
+  local body=$2
+  curl -sSf -b "$COOKIES" -c "$COOKIES" -H "Content-Type: application/json" \
+    -H "Accept: application/json" -d "$body" "$URL/api/rpc/command/$command"
+}
+
+median() { sort -n | awk '{ v[NR] = $1 } END { print v[int((NR + 1) / 2)] }'; }
+
+rpc login-with-password "{\"email\": \"$EMAIL\", \"password\": \"$PASSWORD\"}" >/dev/null
+PROJECT_ID=$(rpc get-profile "{}" | python3 -c 'import json, sys; print(json.load(sys.stdin)["defaultProjectId"])')
+FILE_ID=$(rpc create-file "{\"name\": \"asset benchmark\", \"project-id\": \"$PROJECT_ID\"}" \
+  | python3 -c 'import json, sys; print(json.load(sys.stdin)["id"])')
+
+for run in $(seq "$RUNS"); do
+  curl -sSf -b "$COOKIES" -H "Accept: application/json" -o "$WORKDIR/media-$run.json" \
+    -w "%{time_total}\n" -F "file-id=$FILE_ID" -F "is-local=true" -F "name=benchmark-$run" \
+    -F "content=@$IMAGE" "$URL/api/rpc/command/upload-file-media-object"
+done | median >"$WORKDIR/write"
+
+for run in $(seq "$RUNS"); do
+  MEDIA_ID=$(python3 -c 'import json, sys; print(json.load(sys.stdin)["id"])' <"$WORKDIR/media-$run.json")
+  curl -sSfL -b "$COOKIES" -o /dev/null -w "%{time_total}\n" "$URL/assets/by-file-media-id/$MEDIA_ID"
+done | median >"$WORKDIR/read"
+
+rpc delete-file "{\"id\": \"$FILE_ID\"}" >/dev/null
+
+echo "median asset latency over $RUNS runs"
+echo "write: $(cat "$WORKDIR/write") s"
+echo "read:  $(cat "$WORKDIR/read") s"
@@ -252,3 +252,43 @@ def test_oauth_login(
     logger.info("Final page content (first 1200): %s", page.content()[:1200])
     validate_url = re.compile(rf"^{re.escape(public_url)}/#/auth/register/validate.*")
     page.wait_for_url(validate_url, timeout=120_000)
+
+
+def test_transaction_pooler(juju: jubilant.Juju, deployment: set[str]):
+    """
+    arrange: deploy the Penpot charm and put PgBouncer in transaction mode in front of
+        PostgreSQL.
+    act: integrate penpot with PgBouncer and create a profile using the 'create-profile'
+        charm action.
+    assert: the account created can be used to log in to Penpot.
+    """
+    juju.deploy(
+        "pgbouncer-k8s", channel="1/stable", config={"pool_mode": "transaction"}, trust=True
+    )
+    juju.integrate("pgbouncer-k8s:backend-database", "postgresql-k8s:database")
+    juju.remove_relation("penpot:postgresql", "postgresql-k8s:database")
+    juju.wait(lambda status: jubilant.all_blocked(status, "penpot"), timeout=600)
+    juju.config("penpot", {"database-pooler-mode": "transaction"})
+    juju.integrate("penpot:postgresql", "pgbouncer-k8s:database")
+    juju.wait(
+        lambda status: jubilant.all_active(status, *deployment, "pgbouncer-k8s"), timeout=900
+    )
+    public_url = get_public_url(juju)
+
+    email = secrets.token_hex(8) + "@example.com"
+    for attempt in Retrying(stop=stop_after_attempt(60), wait=wait_fixed(5), reraise=True):
+        with attempt:
+            task = juju.run("penpot/0", "create-profile", {"email": email, "fullname": "test"})
+            password = task.results.get("password", "")
+            if not password:
+                raise AssertionError("profile creation not ready")
+
+    for attempt in Retrying(stop=stop_after_attempt(30), wait=wait_fixed(5), reraise=True):
+        with attempt:
+            response = requests.post(
+                f"{public_url}/api/rpc/command/login-with-password",
+                json={"~:email": email, "~:password": password},
+                timeout=10,
+                verify=False,
+            )
+            assert response.status_code == 200
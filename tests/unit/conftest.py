@@ -3,10 +3,13 @@
 
 """Unit tests fixtures."""
 
+import contextlib
 import json
+import pathlib
+import sqlite3
 from collections.abc import Iterable
 from secrets import token_hex
-from typing import cast
+from typing import Any, cast
 
 import pytest
 from ops import pebble, testing
@@ -34,6 +37,7 @@ def penpot_container(
     can_connect: bool = True,
     include_backend: bool = False,
     execs: Iterable[Exec] | None = None,
+    mounts: dict[str, testing.Mount] | None = None,
 ) -> ScenarioContainer:
     layers = {}
     service_statuses = {}
@@ -57,6 +61,7 @@ def penpot_container(
             layers=layers,
             service_statuses=service_statuses,
             execs=frozenset(execs or ()),
+            mounts=mounts or {},
         ),  # type: ignore[call-arg]
     )
 
@@ -127,9 +132,53 @@ def ingress_relation(url: str = "https://penpot.local/") -> Relation:
     )
 
 
-def peer_relation(*, secret_id: str, peers: Iterable[int] = (1,)) -> PeerRelation:
+def peer_relation(
+    *, secret_id: str, peers: Iterable[int] = (1,), app_data: dict[str, str] | None = None
+) -> PeerRelation:
     return PeerRelation(
         endpoint="penpot_peer",
-        local_app_data={"secrets": secret_id},
-        peers_data={peer_id: {} for peer_id in peers},
+        local_app_data={"secrets": secret_id, **(app_data or {})},
+        peers_data={peer_id: {"ingress-address": f"10.1.0.{peer_id}"} for peer_id in peers},
     )
+
+
+def otlp_span(name: str, end: int, **fields: Any) -> dict[str, Any]:
+    """Build an OTLP JSON span ending a millisecond after it starts.
+
+    Args:
+        name: Span name.
+        end: End time of the span, in nanoseconds.
+        fields: Other OTLP JSON span fields, like parentSpanId or attributes.
+
+    Returns:
+        OTLP JSON span.
+    """
+    return {
+        "traceId": token_hex(16),
+        "spanId": token_hex(8),
+        "name": name,
+        "startTimeUnixNano": str(end - 1_000_000),
+        "endTimeUnixNano": str(end),
+        **fields,
+    }
+
+
+def tracing_buffer(path: pathlib.Path, spans: Iterable[dict[str, Any]]) -> None:
+    """Store OTLP JSON spans in a buffer with the schema of ops-tracing, one chunk each.
+
+    Args:
+        path: Path of the ops-tracing buffer.
+        spans: OTLP JSON spans.
+    """
+    with contextlib.closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracing (id INTEGER PRIMARY KEY,"
+            " priority INTEGER NOT NULL, data BLOB NOT NULL, mime TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO tracing (priority, data, mime) VALUES (0, ?, 'application/json')",
+            [
+                (json.dumps({"resourceSpans": [{"scopeSpans": [{"spans": [span]}]}]}).encode(),)
+                for span in spans
+            ],
+        )
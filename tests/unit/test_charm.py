@@ -3,13 +3,22 @@
 
 """Unit tests."""
 
+import contextlib
+import dataclasses
+import json
+import pathlib
+import sqlite3
+import subprocess
+import sys
+import time
 from secrets import token_hex
 
+import ops
 import pytest
-from ops import testing
+from ops import pebble, testing
 from ops.testing import Exec, Secret
 
-from src.charm import PenpotCharm
+from src.charm import CLUSTER_DNS_TTL, PenpotCharm
 from tests.unit.conftest import (
     PEER_SECRET_ID,
     POSTGRESQL_PASSWORD,
@@ -18,12 +27,14 @@ from tests.unit.conftest import (
     SMTP_TEST_PASSWORD,
     SMTP_TEST_USER,
     ingress_relation,
+    otlp_span,
     peer_relation,
     penpot_container,
     postgresql_relation,
     redis_relation,
     s3_relation,
     smtp_relation,
+    tracing_buffer,
 )
 
 
@@ -31,7 +42,8 @@ def test_postgresql_config(monkeypatch: pytest.MonkeyPatch, context: testing.Con
     """
     arrange: initialize the testing context with required integrations.
     act: run reconcile via config-changed and retrieve the output state.
-    assert: ensure postgresql variables are present in the backend container env.
+    assert: ensure postgresql variables are present in the backend container env, and
+        prepared statements are disabled behind a transaction pooler.
     """
     monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
     peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
@@ -53,6 +65,75 @@ def test_postgresql_config(monkeypatch: pytest.MonkeyPatch, context: testing.Con
     assert backend_env["PENPOT_DATABASE_URI"] == "postgresql://postgresql-endpoint:5432/penpot"
     assert backend_env["PENPOT_DATABASE_USERNAME"] == "postgresql-username"
 
+    out = context.run(
+        context.on.config_changed(),
+        dataclasses.replace(out, config={"database-pooler-mode": "transaction"}),
+    )
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert (
+        backend_env["PENPOT_DATABASE_URI"]
+        == "postgresql://postgresql-endpoint:5432/penpot?prepareThreshold=0"
+    )
+
+
+def test_database_pool_size(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: initialize the testing context with a database connection budget and a peer.
+    act: run reconcile via config-changed, again after scaling to six units, after scaling
+        back to two units, after another backend configuration change and after a budget
+        change.
+    assert: ensure the backend pool size is the budget share of each unit, and the pools stay
+        within the budget after the scale up, while the running backend only picks up a larger
+        share when it restarts for another reason or the budget changes.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    other_relations = {postgresql_relation(), redis_relation(), s3_relation(), ingress_relation()}
+    state = testing.State(
+        relations={peer_relation(secret_id=peer_secret.id), *other_relations},
+        secrets={peer_secret},
+        containers={penpot_container()},
+        config={"database-connections": 120},
+    )
+    out = context.run(context.on.config_changed(), state)
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["PENPOT_DATABASE_MAX_POOL_SIZE"] == "60"
+    assert backend_env["PENPOT_DATABASE_MIN_POOL_SIZE"] == "15"
+
+    peer = peer_relation(secret_id=peer_secret.id, peers=range(1, 6))
+    out = context.run(
+        context.on.relation_changed(peer),
+        dataclasses.replace(out, relations={peer, *other_relations}),
+    )
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["PENPOT_DATABASE_MAX_POOL_SIZE"] == "20"
+    assert backend_env["PENPOT_DATABASE_MIN_POOL_SIZE"] == "5"
+    assert int(backend_env["PENPOT_DATABASE_MAX_POOL_SIZE"]) * 6 <= 120
+
+    peer = peer_relation(secret_id=peer_secret.id)
+    out = context.run(
+        context.on.relation_changed(peer),
+        dataclasses.replace(out, relations={peer, *other_relations}),
+    )
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["PENPOT_DATABASE_MAX_POOL_SIZE"] == "20"
+
+    config: dict[str, str | int | float | bool] = {
+        "database-connections": 120,
+        "backend-jvm-options": "-Xss1m",
+    }
+    out = context.run(context.on.config_changed(), dataclasses.replace(out, config=config))
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["PENPOT_DATABASE_MAX_POOL_SIZE"] == "60"
+    assert backend_env["PENPOT_DATABASE_MIN_POOL_SIZE"] == "15"
+
+    config = {**config, "database-connections": 240}
+    out = context.run(context.on.config_changed(), dataclasses.replace(out, config=config))
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["PENPOT_DATABASE_MAX_POOL_SIZE"] == "120"
+
 
 def test_redis_config(monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]):
     """
@@ -109,6 +190,57 @@ def test_s3_config(monkeypatch: pytest.MonkeyPatch, context: testing.Context[Pen
     assert backend_env["PENPOT_STORAGE_ASSETS_S3_REGION"] == "us-east-1"
 
 
+def test_filesystem_asset_storage(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: initialize the testing context with the filesystem asset storage and no s3.
+    act: run reconcile via config-changed without storage, with storage and with a peer.
+    assert: ensure penpot waits for the storage, then uses it, and blocks with a peer.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id, peers=()),
+            postgresql_relation(),
+            redis_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+        config={"asset-storage": "filesystem", "asset-cache-size": 1024},
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.BlockedStatus("waiting for assets storage")
+
+    state = dataclasses.replace(state, storages={testing.Storage("assets")})
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.ActiveStatus()
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["PENPOT_ASSETS_STORAGE_BACKEND"] == "assets-fs"
+    assert backend_env["PENPOT_STORAGE_ASSETS_FS_DIRECTORY"] == "/opt/data/assets"
+    assert "AWS_ACCESS_KEY_ID" not in backend_env
+    root = out.get_container("penpot").get_filesystem(context)
+    assert (root / "opt/data/assets").is_dir()
+    http_config = root / "etc/nginx/overrides/http.d/penpot-charm.conf"
+    assert "proxy_cache_path" not in http_config.read_text()
+
+    state = dataclasses.replace(
+        state,
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            ingress_relation(),
+        },
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.BlockedStatus(
+        "filesystem asset storage requires a single unit"
+    )
+
+
 def test_smtp_config(monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]):
     """
     arrange: initialize the testing context with required integrations.
@@ -213,6 +345,59 @@ def test_smtp_config_override_from_address(
     assert backend_env["PENPOT_SMTP_USERNAME"] == SMTP_TEST_USER
 
 
+def test_integrations_resolved_once_per_reconcile(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: initialize the testing context with all integrations and count integration reads.
+    act: run reconcile via config-changed.
+    assert: ensure each integration is resolved only once during the reconcile.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    calls: dict[str, int] = {}
+
+    def count_calls(name, original):
+        def counted(self):
+            calls[name] = calls.get(name, 0) + 1
+            return original(self)
+
+        return counted
+
+    for getter in (
+        "_get_penpot_secret_key",
+        "_get_postgresql_credentials",
+        "_get_redis_credentials",
+        "_get_s3_credentials",
+        "_get_smtp_credentials",
+        "_get_penpot_oauth_config",
+    ):
+        monkeypatch.setattr(PenpotCharm, getter, count_calls(getter, getattr(PenpotCharm, getter)))
+    smtp_secret = Secret(tracked_content={"password": SMTP_TEST_PASSWORD}, id=SMTP_SECRET_ID)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            smtp_relation(use_password=True, password_id=smtp_secret.id),
+            ingress_relation(),
+        },
+        secrets={peer_secret, smtp_secret},
+        containers={penpot_container()},
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.ActiveStatus()
+    assert calls == {
+        "_get_penpot_secret_key": 1,
+        "_get_postgresql_credentials": 1,
+        "_get_redis_credentials": 1,
+        "_get_s3_credentials": 1,
+        "_get_smtp_credentials": 1,
+        "_get_penpot_oauth_config": 1,
+    }
+
+
 def test_smtp_penpot_option(context: testing.Context[PenpotCharm]):
     """
     arrange: initialize the testing context.
@@ -223,7 +408,7 @@ def test_smtp_penpot_option(context: testing.Context[PenpotCharm]):
     with context(context.on.start(), base_state) as mgr:
         mgr.run()
         charm = mgr.charm
-        flags = charm._get_penpot_backend_options()
+        flags = charm._get_penpot_backend_options(charm._load_state())
     assert flags == [
         "disable-log-emails",
         "disable-onboarding-questions",
@@ -241,7 +426,7 @@ def test_smtp_penpot_option(context: testing.Context[PenpotCharm]):
     with context(context.on.start(), smtp_state) as mgr:
         mgr.run()
         charm = mgr.charm
-        flags = charm._get_penpot_backend_options()
+        flags = charm._get_penpot_backend_options(charm._load_state())
     assert flags == [
         "disable-log-emails",
         "disable-onboarding-questions",
@@ -314,7 +499,7 @@ def test_penpot_pebble_layer(context: testing.Context[PenpotCharm]):
     with context(context.on.start(), state) as mgr:
         mgr.run()
         charm = mgr.charm
-    plan = charm._gen_pebble_plan()
+    plan = charm._gen_pebble_plan(charm._load_state())
     del plan["services"]["backend"]["environment"]["PENPOT_SECRET_KEY"]
     del plan["services"]["exporter"]["environment"]["PENPOT_SECRET_KEY"]
     del plan["services"]["frontend"]["environment"]["PENPOT_INTERNAL_RESOLVER"]
@@ -328,16 +513,49 @@ def test_penpot_pebble_layer(context: testing.Context[PenpotCharm]):
                 "level": "alive",
                 "override": "replace",
                 "period": "30s",
-            }
+                "threshold": 3,
+            },
+            "backend-http": {
+                "http": {"url": "http://localhost:6060/readyz"},
+                "override": "replace",
+                "period": "10s",
+                "threshold": 12,
+            },
+            "backend-warmup": {
+                "exec": {"command": "true"},
+                "level": "ready",
+                "override": "replace",
+                "period": "10s",
+                "threshold": 1,
+            },
+            "exporter-alive": {
+                "exec": {
+                    # pylint: disable=line-too-long
+                    "command": 'bash -c "pebble services exporter | grep -q inactive || curl -s -m 5 -o /dev/null localhost:6061"'
+                },
+                "override": "replace",
+                "period": "30s",
+                "threshold": 3,
+            },
         },
         "description": "penpot services",
         "services": {
             "backend": {
-                "command": "/opt/penpot/backend/run.sh",
+                "command": (
+                    "bash -c 'rm -f /opt/penpot/backend/.warmup; ("
+                    "until curl -sf -m 5 -o /dev/null localhost:6060/readyz; do sleep 1; done; "
+                    "pebble notify canonical.com/penpot/backend-ready) & "
+                    "exec /opt/penpot/backend/run.sh'"
+                ),
                 "environment": {
                     "AWS_ACCESS_KEY_ID": "s3-access-key",
                     "AWS_SECRET_ACCESS_KEY": S3_SECRET_KEY,
                     "JAVA_HOME": "/usr/lib/jvm/java-25-openjdk-amd64",
+                    "JDK_JAVA_OPTIONS": (
+                        "-XX:+UseG1GC "
+                        "-XX:AOTCache=/opt/penpot/backend/penpot.aot "
+                        "-Xlog:gc*:file=/opt/penpot/backend/gc.log:time,uptime:filecount=5,filesize=10m"
+                    ),
                     "PENPOT_ASSETS_STORAGE_BACKEND": "assets-s3",
                     "PENPOT_DATABASE_PASSWORD": POSTGRESQL_PASSWORD,
                     "PENPOT_DATABASE_URI": "postgresql://postgresql-endpoint:5432/penpot",
@@ -375,6 +593,7 @@ def test_penpot_pebble_layer(context: testing.Context[PenpotCharm]):
                     "PENPOT_REDIS_URI": "redis://redis-hostname:6379",
                     "PLAYWRIGHT_BROWSERS_PATH": "/opt/penpot/exporter/browsers",
                 },
+                "on-check-failure": {"exporter-alive": "restart"},
                 "override": "replace",
                 "working-dir": "/opt/penpot/exporter/",
             },
@@ -416,6 +635,268 @@ def test_penpot_exporter_unit(context: testing.Context[PenpotCharm]):
     assert charm._get_penpot_exporter_unit() == "penpot/0"
 
 
+def test_penpot_exporter_pool(monkeypatch: pytest.MonkeyPatch):
+    """
+    arrange: initialize the testing context on a non-exporter unit with exporter-mode pool.
+    act: run reconcile via config-changed and retrieve the output state.
+    assert: ensure the unit runs its own exporter and its frontend uses it.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id, peers=(0, 2)),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+        config={"exporter-mode": "pool"},
+    )
+    context = testing.Context(PenpotCharm, unit_id=1)
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.ActiveStatus()
+    container = out.get_container("penpot")
+    assert container.service_statuses["exporter"] == pebble.ServiceStatus.ACTIVE
+    frontend_env = container.plan.services["frontend"].environment
+    assert frontend_env["PENPOT_EXPORTER_URI"] == "http://127.0.0.1:6061"
+
+    out = context.run(
+        context.on.config_changed(), dataclasses.replace(out, config={"exporter-mode": "single"})
+    )
+    container = out.get_container("penpot")
+    assert container.service_statuses["exporter"] == pebble.ServiceStatus.INACTIVE
+    frontend_env = container.plan.services["frontend"].environment
+    assert frontend_env["PENPOT_EXPORTER_URI"].startswith("http://penpot-0.penpot-endpoints.")
+
+
+def test_exporter_check_on_non_exporter_unit(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+):
+    """
+    arrange: initialize the testing context on a non-exporter unit with exporter-mode single.
+    act: run reconcile via config-changed, then run the exporter-alive check command with
+        the exporter stopped and with the exporter running but not listening.
+    assert: ensure the exporter is stopped, the check isn't part of the pod liveness probe
+        and only fails in the latter case.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id, peers=(0, 2)),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+    )
+    context = testing.Context(PenpotCharm, unit_id=1)
+    out = context.run(context.on.config_changed(), state)
+    container = out.get_container("penpot")
+    assert container.service_statuses.get("exporter") != pebble.ServiceStatus.ACTIVE
+    check = container.plan.checks["exporter-alive"]
+    assert check.level != pebble.CheckLevel.ALIVE
+    assert check.exec
+
+    pebble_cli = tmp_path / "pebble"
+    for current, returncode in (("inactive", 0), ("active", 7)):
+        pebble_cli.write_text(f"#!/bin/sh\necho 'exporter  enabled  {current}  today'\n")
+        pebble_cli.chmod(0o755)
+        result = subprocess.run(
+            ["bash", "-c", check.exec["command"].removeprefix("bash -c ").strip('"')],
+            env={"PATH": f"{tmp_path}:/usr/bin:/bin"},
+            check=False,
+        )
+        assert result.returncode == returncode
+
+
+def test_penpot_unit_roles(monkeypatch: pytest.MonkeyPatch):
+    """
+    arrange: initialize the testing context for units 0 and 1 of three with one worker unit.
+    act: run reconcile via config-changed on each unit.
+    assert: ensure unit 0 is a worker whose frontend forwards the API calls to the other
+        units, skipping failing ones, and unit 1 serves the API only, both staying ready.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+
+    def run(unit_id: int) -> tuple[pebble.Plan, str, str]:
+        peers = {0, 1, 2} - {unit_id}
+        state = testing.State(
+            relations={
+                peer_relation(secret_id=peer_secret.id, peers=peers),
+                postgresql_relation(),
+                redis_relation(),
+                s3_relation(),
+                ingress_relation(),
+            },
+            secrets={peer_secret},
+            containers={penpot_container()},
+            config={"worker-units": 1},
+        )
+        context = testing.Context(PenpotCharm, unit_id=unit_id)
+        out = context.run(context.on.config_changed(), state)
+        if unit_id == 0:
+            assert out.unit_status == testing.ActiveStatus("background worker")
+        else:
+            assert out.unit_status == testing.ActiveStatus()
+        container = out.get_container("penpot")
+        overrides = container.get_filesystem(context) / "etc/nginx/overrides"
+        return (
+            container.plan,
+            (overrides / "http.d/penpot-charm.conf").read_text(),
+            (overrides / "server.d/penpot-charm.conf").read_text(),
+        )
+
+    worker_plan, worker_http_config, worker_server_config = run(0)
+    assert (
+        "disable-backend-worker"
+        not in worker_plan.services["backend"].environment["PENPOT_FLAGS"].split()
+    )
+    assert (
+        "upstream penpot_api {\n"
+        "    server 10.1.0.1:6060 max_fails=3 fail_timeout=10s;\n"
+        "    server 10.1.0.2:6060 max_fails=3 fail_timeout=10s;\n"
+    ) in worker_http_config
+    assert "upstream penpot_backend" not in worker_http_config
+    assert "proxy_next_upstream error timeout;" in worker_server_config
+    assert "proxy_pass http://penpot_api;" in worker_server_config
+    api_plan, api_http_config, _ = run(1)
+    assert (
+        "disable-backend-worker"
+        in api_plan.services["backend"].environment["PENPOT_FLAGS"].split()
+    )
+    assert "upstream penpot_api" not in api_http_config
+    assert worker_plan.checks == api_plan.checks
+    assert "upstream penpot_backend" in api_http_config
+
+
+def test_penpot_exporter_limits(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: initialize the testing context with an 8 GiB penpot container memory limit.
+    act: run reconcile via config-changed, then again with the exporter limits configured.
+    assert: ensure the exporter limits are derived from the memory limit unless configured.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    memory_max = tmp_path / "memory.max"
+    memory_max.write_text(f"{8 * 2**30}\n")
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={
+            penpot_container(
+                mounts={
+                    "memory": testing.Mount(
+                        location="/sys/fs/cgroup/memory.max", source=memory_max
+                    )
+                }
+            )
+        },
+    )
+    out = context.run(context.on.config_changed(), state)
+    exporter_env = out.get_container("penpot").plan.services["exporter"].environment
+    assert exporter_env["PENPOT_BROWSER_POOL_MAX"] == "3"
+    assert exporter_env["NODE_OPTIONS"] == "--max-old-space-size=512"
+
+    out = context.run(
+        context.on.config_changed(),
+        dataclasses.replace(
+            out, config={"exporter-browser-pool-size": 2, "exporter-max-heap-size": 1024}
+        ),
+    )
+    assert out.unit_status == testing.ActiveStatus()
+    exporter_env = out.get_container("penpot").plan.services["exporter"].environment
+    assert exporter_env["PENPOT_BROWSER_POOL_MAX"] == "2"
+    assert exporter_env["NODE_OPTIONS"] == "--max-old-space-size=1024"
+
+
+def test_penpot_backend_jvm_options(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: initialize the testing context with a 16 GiB and 2.5 CPU penpot container limit.
+    act: run reconcile via config-changed, then again with the JVM options configured.
+    assert: ensure the JVM options and thread counts, and the nginx workers, follow the
+        container limits unless configured.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    memory_max = tmp_path / "memory.max"
+    memory_max.write_text(f"{16 * 2**30}\n")
+    cpu_max = tmp_path / "cpu.max"
+    cpu_max.write_text("250000 100000\n")
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={
+            penpot_container(
+                mounts={
+                    "memory": testing.Mount(
+                        location="/sys/fs/cgroup/memory.max", source=memory_max
+                    ),
+                    "cpu": testing.Mount(location="/sys/fs/cgroup/cpu.max", source=cpu_max),
+                }
+            )
+        },
+    )
+    out = context.run(context.on.config_changed(), state)
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["JDK_JAVA_OPTIONS"].split()[:3] == [
+        "-XX:MaxRAMPercentage=50",
+        "-XX:ActiveProcessorCount=3",
+        "-XX:+UseZGC",
+    ]
+    assert "-XX:AOTCache=/opt/penpot/backend/penpot.aot" not in backend_env["JDK_JAVA_OPTIONS"]
+    assert "-Djdk.virtualThreadScheduler.parallelism=3" in backend_env["JDK_JAVA_OPTIONS"]
+    assert backend_env["PENPOT_HTTP_SERVER_IO_THREADS"] == "3"
+    root = out.get_container("penpot").get_filesystem(context)
+    main_config = root / "etc/nginx/overrides/main.d/penpot-charm.conf"
+    assert "worker_processes 3;" in main_config.read_text()
+
+    out = context.run(
+        context.on.config_changed(),
+        dataclasses.replace(
+            out,
+            config={
+                "backend-max-heap-size": 4096,
+                "backend-gc": "auto",
+                "backend-jvm-options": "-XX:+AlwaysPreTouch",
+                "backend-io-threads": 8,
+                "backend-executor-threads": 16,
+            },
+        ),
+    )
+    assert out.unit_status == testing.ActiveStatus()
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    jvm_options = backend_env["JDK_JAVA_OPTIONS"].split()
+    assert jvm_options[:3] == ["-Xmx4096m", "-XX:ActiveProcessorCount=3", "-XX:+UseG1GC"]
+    assert "-XX:AOTCache=/opt/penpot/backend/penpot.aot" in jvm_options
+    assert jvm_options[-1] == "-XX:+AlwaysPreTouch"
+    assert "-Djdk.virtualThreadScheduler.parallelism=16" in jvm_options
+    assert "-Djava.util.concurrent.ForkJoinPool.common.parallelism=16" in jvm_options
+    assert backend_env["PENPOT_HTTP_SERVER_IO_THREADS"] == "8"
+
+
 def test_penpot_create_profile_action(
     monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
 ):
@@ -477,3 +958,685 @@ def test_penpot_delete_profile_action(context: testing.Context[PenpotCharm]):
     assert context.action_results == {"email": "test@test.com"}
     exec_args = context.exec_history["penpot"][0]
     assert exec_args.command == command
+
+
+def test_reconcile_without_changes_restarts_nothing(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: run reconcile once with all required integrations to start penpot.
+    act: run reconcile again via penpot-peer-relation-changed with the resulting state.
+    assert: ensure no penpot service is restarted by the second reconcile.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    peer = peer_relation(secret_id=peer_secret.id)
+    state = testing.State(
+        relations={
+            peer,
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.get_container("penpot").service_statuses == {
+        "backend": pebble.ServiceStatus.ACTIVE,
+        "frontend": pebble.ServiceStatus.ACTIVE,
+        "exporter": pebble.ServiceStatus.ACTIVE,
+    }
+
+    restarted: list[str] = []
+    monkeypatch.setattr(ops.Container, "restart", lambda self, *names: restarted.extend(names))
+    out = context.run(context.on.relation_changed(peer), out)
+    assert out.unit_status == testing.ActiveStatus()
+    assert restarted == []
+
+
+def test_reconcile_restarts_changed_services_only(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: run reconcile once with all required integrations to start penpot.
+    act: change the smtp-from-address configuration and run reconcile again.
+    assert: ensure only the backend service, whose environment changed, is restarted.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            smtp_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+    )
+    out = context.run(context.on.config_changed(), state)
+
+    restarted: list[str] = []
+    monkeypatch.setattr(ops.Container, "restart", lambda self, *names: restarted.extend(names))
+    out = context.run(
+        context.on.config_changed(),
+        dataclasses.replace(out, config={"smtp-from-address": "test@test.com"}),
+    )
+    assert out.unit_status == testing.ActiveStatus()
+    assert restarted == ["backend"]
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert backend_env["PENPOT_SMTP_DEFAULT_FROM"] == "test@test.com"
+
+
+def test_events_in_one_dispatch_reconcile_once(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: initialize the testing context with a deferred config-changed event pending.
+    act: run update-status, which re-emits the deferred event in the same dispatch.
+    assert: ensure the charm state is loaded by a single reconcile.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    loads: list[int] = []
+    original_load_state = PenpotCharm._load_state
+
+    def load_state(self):
+        loads.append(1)
+        return original_load_state(self)
+
+    monkeypatch.setattr(PenpotCharm, "_load_state", load_state)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+        deferred=[context.on.config_changed().deferred(handler=PenpotCharm._request_reconcile)],
+    )
+    out = context.run(context.on.update_status(), state)
+    assert out.unit_status == testing.ActiveStatus()
+    assert len(loads) == 1
+
+
+def test_unchanged_plan_skips_pebble_plan_comparison(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: run reconcile once with all required integrations to start penpot.
+    act: run reconcile again via penpot-peer-relation-changed with the resulting state.
+    assert: ensure the pebble plan is neither read nor updated by the second reconcile.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    peer = peer_relation(secret_id=peer_secret.id)
+    state = testing.State(
+        relations={
+            peer,
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+    )
+    out = context.run(context.on.config_changed(), state)
+
+    pebble_calls: list[str] = []
+    monkeypatch.setattr(ops.Container, "get_plan", lambda self: pebble_calls.append("get_plan"))
+    monkeypatch.setattr(
+        ops.Container, "add_layer", lambda self, *args, **kwargs: pebble_calls.append("add_layer")
+    )
+    out = context.run(context.on.relation_changed(peer), out)
+    assert out.unit_status == testing.ActiveStatus()
+    assert pebble_calls == []
+
+
+def test_nginx_config(monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]):
+    """
+    arrange: run reconcile once with all required integrations to start penpot.
+    act: alter the nginx configuration managed by the charm and run reconcile again.
+    assert: ensure the configuration is restored and nginx is reloaded without a restart,
+        and the workers, the upstream keepalive and the asset cache follow the
+        configuration.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+    )
+    out = context.run(context.on.config_changed(), state)
+    root = out.get_container("penpot").get_filesystem(context)
+    server_config = root / "etc/nginx/overrides/server.d/penpot-charm.conf"
+    assert "location ^~ /js/ {" in server_config.read_text()
+    http_config = root / "etc/nginx/overrides/http.d/penpot-charm.conf"
+    assert "immutable" in http_config.read_text()
+    main_config = root / "etc/nginx/overrides/main.d/penpot-charm.conf"
+    assert "worker_processes auto;" in main_config.read_text()
+    assert "worker_rlimit_nofile 16384;" in main_config.read_text()
+    events_config = root / "etc/nginx/overrides/events.d/penpot-charm.conf"
+    assert events_config.read_text() == "worker_connections 8192;\n"
+    assert "location ^~ /api/rpc/ {" in server_config.read_text()
+    assert "location = /api/export {" in server_config.read_text()
+    assert "keepalive 32;" in http_config.read_text()
+    assert "keepalive_timeout 4s;" in http_config.read_text()
+
+    signals: list[tuple[str, tuple[str, ...]]] = []
+    monkeypatch.setattr(
+        ops.Container, "send_signal", lambda self, sig, *names: signals.append((sig, names))
+    )
+    server_config.write_text("")
+    out = context.run(context.on.config_changed(), out)
+    assert "location ^~ /js/ {" in server_config.read_text()
+    assert "proxy_cache" not in server_config.read_text()
+    assert signals == [("SIGHUP", ("frontend",))]
+
+    out = context.run(
+        context.on.config_changed(),
+        dataclasses.replace(
+            out,
+            config={
+                "asset-cache-size": 2048,
+                "frontend-worker-processes": 4,
+                "frontend-worker-connections": 16384,
+                "frontend-upstream-keepalive": 0,
+            },
+        ),
+    )
+    assert "worker_processes 4;" in main_config.read_text()
+    assert events_config.read_text() == "worker_connections 16384;\n"
+    assert "upstream" not in http_config.read_text()
+    assert "keys_zone=penpot_assets:16m max_size=2048m" in http_config.read_text()
+    assert "proxy_cache_key $uri;" in server_config.read_text()
+    assert len(signals) == 2
+
+
+def test_rpc_limits(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: run reconcile once with RPC rate and concurrency limits configured.
+    act: change the rate limits, then the concurrency limits, then set invalid limits.
+    assert: ensure the limits files are pushed, the penpot default concurrency limits not
+        configured are kept, only concurrency limit changes restart the backend, and invalid
+        limits block the unit.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    config: dict[str, str | int | float | bool] = {
+        "rpc-rate-limits": "default: [{name: default, strategy: window, limit: 1000/h}]",
+        "rpc-concurrency-limits": "process-image/global: {permits: 4, queue: 32}",
+    }
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={
+            penpot_container(
+                mounts={"backend": testing.Mount(location="/opt/penpot/backend", source=tmp_path)}
+            )
+        },
+        config=config,
+    )
+    (tmp_path / "climit.defaults.edn").write_text(
+        "{:root/global {:permits 40}\n :process-image/global {:permits 8}}\n"
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.ActiveStatus()
+    backend_env = out.get_container("penpot").plan.services["backend"].environment
+    assert {"enable-rpc-rlimit", "enable-rpc-climit"} <= set(backend_env["PENPOT_FLAGS"].split())
+    assert backend_env["PENPOT_RPC_RLIMIT_CONFIG"] == "/opt/penpot/backend/rlimit.edn"
+    assert backend_env["PENPOT_RPC_CLIMIT_CONFIG"] == "/opt/penpot/backend/climit.edn"
+    rlimit_config = tmp_path / "rlimit.edn"
+    assert '"1000/h"' in rlimit_config.read_text()
+    climit_config = tmp_path / "climit.edn"
+    assert climit_config.read_text() == (
+        "{:root/global {:permits 40}\n :process-image/global {:permits 4 :queue 32}}\n"
+    )
+
+    restarted: list[str] = []
+    monkeypatch.setattr(ops.Container, "restart", lambda self, *names: restarted.extend(names))
+    config["rpc-rate-limits"] = "default: [{name: default, strategy: window, limit: 500/h}]"
+    out = context.run(context.on.config_changed(), dataclasses.replace(out, config=config))
+    assert '"500/h"' in rlimit_config.read_text()
+    assert restarted == []
+
+    config["rpc-concurrency-limits"] = "process-image/global: {permits: 2}"
+    out = context.run(context.on.config_changed(), dataclasses.replace(out, config=config))
+    assert ":process-image/global {:permits 2}" in climit_config.read_text()
+    assert ":root/global {:permits 40}" in climit_config.read_text()
+    assert restarted == ["backend"]
+
+    config["rpc-concurrency-limits"] = "process-image/global: {permits: 0}"
+    out = context.run(context.on.config_changed(), dataclasses.replace(out, config=config))
+    assert out.unit_status == testing.BlockedStatus(
+        "invalid rpc-concurrency-limits: process-image/global needs permits"
+    )
+
+
+def test_backend_readiness_from_pebble_events(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: start penpot with all required integrations while the backend is starting.
+    act: emit the backend ready pebble notice, then the backend-http check-failed event
+        after the backend stops answering, then the check-recovered event.
+    assert: ensure the unit waits for penpot services, becomes active on the notice, is
+        blocked once the check fails and becomes active again when it recovers.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: False)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.WaitingStatus("waiting for penpot services")
+
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    container = dataclasses.replace(
+        out.get_container("penpot"),
+        notices=[testing.Notice(key="canonical.com/penpot/backend-ready")],
+    )
+    out = dataclasses.replace(out, containers={container})
+    out = context.run(context.on.pebble_custom_notice(container, container.notices[0]), out)
+    assert out.unit_status == testing.ActiveStatus()
+
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: False)
+    container = out.get_container("penpot")
+    check_info = next(check for check in container.check_infos if check.name == "backend-http")
+    other_checks = {check for check in container.check_infos if check.name != "backend-http"}
+    check_info = dataclasses.replace(
+        check_info, status=pebble.CheckStatus.DOWN, failures=12, threshold=12
+    )
+    container = dataclasses.replace(container, check_infos={*other_checks, check_info})
+    out = dataclasses.replace(out, containers={container})
+    out = context.run(context.on.pebble_check_failed(container, check_info), out)
+    assert out.unit_status == testing.BlockedStatus("timeout waiting for penpot services")
+
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    check_info = dataclasses.replace(check_info, status=pebble.CheckStatus.UP, failures=0)
+    container = dataclasses.replace(container, check_infos={*other_checks, check_info})
+    out = dataclasses.replace(out, containers={container})
+    out = context.run(context.on.pebble_check_recovered(container, check_info), out)
+    assert out.unit_status == testing.ActiveStatus()
+
+
+def test_backend_warmup(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: start penpot with all required integrations and backend-warmup-requests set.
+    act: run reconcile via config-changed, then on the backend ready notice sent once the
+        backend warmup is over.
+    assert: ensure the backend runs the warmup before sending the notice, and the unit is
+        active only once it's over.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(secret_id=peer_secret.id),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+        config={"backend-warmup-requests": 2000},
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.WaitingStatus("waiting for penpot backend warmup")
+    container = out.get_container("penpot")
+    backend_command = container.plan.services["backend"].command
+    assert "/api/rpc/command/{get-profile}?warmup=[1-2000]" in backend_command
+    assert backend_command.index("> /opt/penpot/backend/.warmup") < backend_command.index(
+        "pebble notify"
+    )
+    assert backend_command.endswith("exec /opt/penpot/backend/run.sh'")
+    assert container.plan.checks["backend-warmup"].level == pebble.CheckLevel.READY
+
+    warmup_file = tmp_path / ".warmup"
+    warmup_file.write_text("4200\n")
+    container = dataclasses.replace(
+        container,
+        mounts={
+            "warmup": testing.Mount(location="/opt/penpot/backend/.warmup", source=warmup_file)
+        },
+    )
+    notice = testing.Notice(key="canonical.com/penpot/backend-ready")
+    container = dataclasses.replace(container, notices=[notice])
+    out = context.run(
+        context.on.pebble_custom_notice(container, notice),
+        dataclasses.replace(out, containers={container}),
+    )
+    assert out.unit_status == testing.ActiveStatus()
+
+
+def test_cluster_dns_reused_from_peer_integration(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: store the cluster DNS settings in the peer integration on a non-leader unit.
+    act: run reconcile via config-changed and retrieve the output state.
+    assert: ensure the stored settings are used without any DNS lookup, with the resolver
+        caching parameters following the configuration.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+
+    def fail_dns_lookup(*args, **kwargs):
+        raise AssertionError("unexpected DNS lookup")
+
+    monkeypatch.setattr("dns.resolver.resolve", fail_dns_lookup)
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(
+        relations={
+            peer_relation(
+                secret_id=peer_secret.id,
+                app_data={
+                    "cluster-domain": "example.internal",
+                    "internal-resolver": "10.0.0.10",
+                },
+            ),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+        model=testing.Model(name="test"),
+    )
+    out = context.run(context.on.config_changed(), state)
+    assert out.unit_status == testing.ActiveStatus()
+    frontend_env = out.get_container("penpot").plan.services["frontend"].environment
+    assert frontend_env["PENPOT_INTERNAL_RESOLVER"] == "10.0.0.10"
+    assert frontend_env["PENPOT_EXPORTER_URI"] == (
+        "http://penpot-0.penpot-endpoints.test.svc.example.internal:6061"
+    )
+
+    out = context.run(
+        context.on.config_changed(),
+        dataclasses.replace(
+            out, config={"frontend-dns-cache-ttl": 300, "frontend-dns-ipv6": False}
+        ),
+    )
+    frontend_env = out.get_container("penpot").plan.services["frontend"].environment
+    assert frontend_env["PENPOT_INTERNAL_RESOLVER"] == "10.0.0.10 valid=300s ipv6=off"
+
+
+def test_cluster_dns_stored_by_leader(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: initialize the testing context as leader without stored cluster DNS settings.
+    act: run reconcile via config-changed and retrieve the output state.
+    assert: ensure the discovered cluster DNS settings are stored in the peer integration.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    monkeypatch.setattr(
+        PenpotCharm, "_get_kubernetes_cluster_domain", lambda self: "example.internal"
+    )
+    monkeypatch.setattr(PenpotCharm, "_get_local_resolver", lambda self, _: "10.0.0.10")
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    peer = peer_relation(secret_id=peer_secret.id)
+    state = testing.State(
+        relations={
+            peer,
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+        leader=True,
+    )
+    out = context.run(context.on.config_changed(), state)
+    app_data: dict[str, str] = dict(out.get_relation(peer.id).local_app_data)
+    assert app_data["cluster-domain"] == "example.internal"
+    assert app_data["internal-resolver"] == "10.0.0.10"
+    assert (
+        out.get_stored_state("_stored", owner_path="PenpotCharm").content["cluster_dns_checked_at"]
+        > 0
+    )
+
+
+def cluster_dns_state(checked_age: int) -> testing.State:
+    """Build a leader state with cluster DNS settings stored in the peer integration.
+
+    Args:
+        checked_age: Seconds since the leader last checked the settings.
+
+    Returns:
+        Testing state.
+    """
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    return testing.State(
+        relations={
+            peer_relation(
+                secret_id=peer_secret.id,
+                app_data={"cluster-domain": "cluster.local", "internal-resolver": "10.0.0.1"},
+            ),
+            postgresql_relation(),
+            redis_relation(),
+            s3_relation(),
+            ingress_relation(),
+        },
+        secrets={peer_secret},
+        containers={penpot_container()},
+        stored_states={
+            testing.StoredState(
+                owner_path="PenpotCharm",
+                content={"cluster_dns_checked_at": time.time() - checked_age},
+            )
+        },
+        leader=True,
+    )
+
+
+@pytest.mark.parametrize(
+    "age, cluster_domain",
+    [
+        pytest.param(60, "cluster.local", id="valid"),
+        pytest.param(CLUSTER_DNS_TTL + 60, "example.internal", id="expired"),
+    ],
+)
+def test_cluster_dns_expiry(
+    monkeypatch: pytest.MonkeyPatch,
+    context: testing.Context[PenpotCharm],
+    age: int,
+    cluster_domain: str,
+):
+    """
+    arrange: store cluster DNS settings the leader checked some time ago.
+    act: run reconcile via config-changed on the leader unit.
+    assert: ensure the settings are reused while valid and rediscovered once expired.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    monkeypatch.setattr(
+        PenpotCharm, "_get_kubernetes_cluster_domain", lambda self: "example.internal"
+    )
+    monkeypatch.setattr(PenpotCharm, "_get_local_resolver", lambda self, _: "10.0.0.10")
+    state = cluster_dns_state(age)
+    out = context.run(context.on.config_changed(), state)
+    app_data: dict[str, str] = dict(out.get_relations("penpot_peer")[0].local_app_data)
+    assert app_data["cluster-domain"] == cluster_domain
+
+
+def test_cluster_dns_lookup_failure(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: store expired cluster DNS settings and make the DNS lookups fail.
+    act: run reconcile via config-changed on the leader unit, then again once the lookups
+        succeed.
+    assert: ensure the stored settings are kept and used after the failure, and the
+        discovery is retried on the next reconcile.
+    """
+    monkeypatch.setattr(PenpotCharm, "_check_penpot_backend_ready", lambda self: True)
+    monkeypatch.setattr(PenpotCharm, "_get_kubernetes_cluster_domain", lambda self: None)
+    monkeypatch.setattr(PenpotCharm, "_get_local_resolver", lambda self, _: None)
+    out = context.run(context.on.config_changed(), cluster_dns_state(CLUSTER_DNS_TTL + 60))
+    app_data: dict[str, str] = dict(out.get_relations("penpot_peer")[0].local_app_data)
+    assert app_data["cluster-domain"] == "cluster.local"
+    assert app_data["internal-resolver"] == "10.0.0.1"
+    frontend_env = out.get_container("penpot").plan.services["frontend"].environment
+    assert frontend_env["PENPOT_INTERNAL_RESOLVER"] == "10.0.0.1"
+
+    monkeypatch.setattr(
+        PenpotCharm, "_get_kubernetes_cluster_domain", lambda self: "example.internal"
+    )
+    monkeypatch.setattr(PenpotCharm, "_get_local_resolver", lambda self, _: "10.0.0.10")
+    out = context.run(context.on.update_status(), out)
+    app_data = dict(out.get_relations("penpot_peer")[0].local_app_data)
+    assert app_data["cluster-domain"] == "example.internal"
+
+
+def test_refresh_cluster_dns_action(
+    monkeypatch: pytest.MonkeyPatch, context: testing.Context[PenpotCharm]
+):
+    """
+    arrange: store cluster DNS settings that are still valid in the peer integration.
+    act: run the refresh-cluster-dns action on a non-leader and on the leader unit.
+    assert: ensure the action fails on the non-leader and rediscovers the settings on the
+        leader before they expire.
+    """
+    monkeypatch.setattr(
+        PenpotCharm, "_get_kubernetes_cluster_domain", lambda self: "example.internal"
+    )
+    monkeypatch.setattr(PenpotCharm, "_get_local_resolver", lambda self, _: "10.0.0.10")
+    peer = peer_relation(
+        secret_id=PEER_SECRET_ID,
+        app_data={
+            "cluster-domain": "cluster.local",
+            "internal-resolver": "10.0.0.1",
+        },
+    )
+    peer_secret = Secret(tracked_content={"penpot-secret-key": token_hex(16)}, id=PEER_SECRET_ID)
+    state = testing.State(relations={peer}, secrets={peer_secret}, containers={penpot_container()})
+    with pytest.raises(testing.ActionFailed):
+        context.run(context.on.action("refresh-cluster-dns"), state)
+
+    out = context.run(
+        context.on.action("refresh-cluster-dns"), dataclasses.replace(state, leader=True)
+    )
+    assert context.action_results == {
+        "cluster-domain": "example.internal",
+        "internal-resolver": "10.0.0.10",
+    }
+    app_data: dict[str, str] = dict(out.get_relation(peer.id).local_app_data)
+    assert app_data["cluster-domain"] == "example.internal"
+    assert app_data["internal-resolver"] == "10.0.0.10"
+
+
+def test_charm_import_does_not_load_integration_libraries():
+    """
+    arrange: none.
+    act: import ops and the charm module in fresh interpreters.
+    assert: ensure the charm module imports none of the integration libraries and heavy
+        dependencies on top of ops, which loads ops-tracing and its charm libraries itself.
+    """
+    modules = {}
+    for module in ("ops", "charm"):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))",
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        modules[module] = set(json.loads(result.stdout))
+    assert not (modules["charm"] - modules["ops"]).intersection(
+        {
+            "charms.data_platform_libs.v0.data_interfaces",
+            "charms.data_platform_libs.v0.s3",
+            "charms.grafana_k8s.v0.grafana_dashboard",
+            "charms.hydra.v0.oauth",
+            "charms.loki_k8s.v1.loki_push_api",
+            "charms.prometheus_k8s.v0.prometheus_scrape",
+            "charms.smtp_integrator.v0.smtp",
+            "charms.traefik_k8s.v2.ingress",
+            "dns.resolver",
+            "opentelemetry.sdk.trace",
+            "pydantic",
+            "requests",
+        }
+    )
+
+
+def test_profile_action_skips_integration_setup(context: testing.Context[PenpotCharm]):
+    """
+    arrange: initialize the testing context with the penpot backend running.
+    act: run delete-profile charm action.
+    assert: ensure none of the integration requirers are constructed.
+    """
+    command = ["python3", "manage.py", "delete-profile", "--email", "test@test.com"]
+    state = testing.State(
+        containers={penpot_container(include_backend=True, execs={Exec(command)})}
+    )
+    event = context.on.action("delete-profile", params={"email": "test@test.com"})
+    with context(event, state) as mgr:
+        mgr.run()
+        charm = mgr.charm
+    assert not {"postgresql", "redis", "smtp", "s3", "ingress"}.intersection(vars(charm))
+
+
+def test_dump_traces_action(tmp_path: pathlib.Path):
+    """
+    arrange: store trace spans in the ops-tracing buffer of the charm directory.
+    act: run the dump-traces charm action.
+    assert: ensure the most recent spans are returned, and the action fails without a
+        buffer or with an unexpected buffer schema.
+    """
+    buffer = tmp_path / ".tracing-data.db"
+    tracing_buffer(buffer, [otlp_span(f"span-{i}", (i + 1) * 1_000_000) for i in range(5)])
+    context = testing.Context(PenpotCharm, charm_root=tmp_path)
+    state = testing.State(containers={penpot_container()})
+
+    context.run(context.on.action("dump-traces", params={"lines": 2}), state)
+    assert context.action_results
+    spans = [json.loads(line) for line in context.action_results["traces"].splitlines()]
+    assert [span["name"] for span in spans] == ["span-3", "span-4"]
+
+    buffer.unlink()
+    with pytest.raises(testing.ActionFailed):
+        context.run(context.on.action("dump-traces", params={"lines": 2}), state)
+
+    with contextlib.closing(sqlite3.connect(buffer)) as conn:
+        conn.execute("CREATE TABLE tracing (id INTEGER PRIMARY KEY, payload BLOB)")
+    with pytest.raises(testing.ActionFailed, match="unsupported ops-tracing buffer schema"):
+        context.run(context.on.action("dump-traces", params={"lines": 2}), state)
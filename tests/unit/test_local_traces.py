@@ -0,0 +1,77 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Local trace data unit tests."""
+
+import contextlib
+import json
+import pathlib
+import sqlite3
+
+import pytest
+
+from src.local_traces import TRACES_FILENAME, read_traces
+from tests.unit.conftest import otlp_span, tracing_buffer
+
+
+def test_spans_read_from_tracing_buffer(tmp_path: pathlib.Path):
+    """
+    arrange: store a span and its child with attributes in an ops-tracing buffer.
+    act: read the spans.
+    assert: ensure the spans are read with their names, parents, status and attributes.
+    """
+    path = tmp_path / TRACES_FILENAME
+    parent = otlp_span("reconcile", 3_000_000)
+    child = otlp_span(
+        "apply pebble plan",
+        2_000_000,
+        parentSpanId=parent["spanId"],
+        status={"code": 2},
+        attributes=[
+            {
+                "key": "restarted",
+                "value": {"arrayValue": {"values": [{"stringValue": "backend"}]}},
+            },
+            {"key": "units", "value": {"intValue": "2"}},
+        ],
+    )
+    tracing_buffer(path, [parent, child])
+
+    spans = [json.loads(line) for line in read_traces(path, 10)]
+    assert [span["name"] for span in spans] == ["apply pebble plan", "reconcile"]
+    assert spans[0]["parent_id"] == parent["spanId"]
+    assert spans[0]["status"] == "ERROR"
+    assert spans[0]["attributes"] == {"restarted": ["backend"], "units": 2}
+    assert spans[0]["duration_ms"] == 1.0
+    assert spans[1]["parent_id"] is None
+    assert spans[1]["status"] == "UNSET"
+
+
+def test_most_recent_spans_read(tmp_path: pathlib.Path):
+    """
+    arrange: store spans in an ops-tracing buffer, the most recent first.
+    act: read fewer spans than stored.
+    assert: ensure only the most recent spans are read, and none without a buffer.
+    """
+    path = tmp_path / TRACES_FILENAME
+    tracing_buffer(
+        path, [otlp_span(f"span-{i}", (i + 1) * 1_000_000) for i in reversed(range(10))]
+    )
+
+    names = [json.loads(line)["name"] for line in read_traces(path, 3)]
+    assert names == ["span-7", "span-8", "span-9"]
+    assert not read_traces(tmp_path / "missing.db", 3)
+
+
+def test_unsupported_tracing_buffer_schema(tmp_path: pathlib.Path):
+    """
+    arrange: create a buffer whose tracing table doesn't have the ops-tracing 3.7 columns.
+    act: read the spans.
+    assert: ensure the schema mismatch is reported.
+    """
+    path = tmp_path / TRACES_FILENAME
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE tracing (id INTEGER PRIMARY KEY, payload BLOB)")
+
+    with pytest.raises(ValueError, match="unsupported ops-tracing buffer schema"):
+        read_traces(path, 3)
@@ -0,0 +1,129 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""RPC limits configuration unit tests."""
+
+import pytest
+
+from src.rpc_limits import generate_climit_config, generate_rlimit_config
+
+
+def test_rlimit_config():
+    """
+    arrange: define a default window limit and a bucket limit for one RPC method.
+    act: generate the rate limits file.
+    assert: ensure the limits are rendered as penpot rlimit EDN.
+    """
+    config = generate_rlimit_config(
+        """
+        default: [{name: default, strategy: window, limit: 200000/h}]
+        import-binfile: [{name: burst, strategy: bucket, limit: 2/1/10s}]
+        """
+    )
+    assert config == (
+        '{:default [[:default :window "200000/h"]]\n'
+        ' #{:command/import-binfile} [[:burst :bucket "2/1/10s"]]}\n'
+    )
+
+
+def test_climit_config():
+    """
+    arrange: define concurrency limits with and without a queue.
+    act: generate the concurrency limits file.
+    assert: ensure the limits are rendered as penpot climit EDN.
+    """
+    config = generate_climit_config(
+        """
+        process-image/global: {permits: 8, queue: 64}
+        update-file/by-profile: {permits: 1}
+        """
+    )
+    assert config == (
+        "{:process-image/global {:permits 8 :queue 64}\n :update-file/by-profile {:permits 1}}\n"
+    )
+
+
+def test_climit_config_merged_with_defaults():
+    """
+    arrange: write penpot default concurrency limits with comments and multiline entries.
+    act: generate the concurrency limits file overriding one default limiter and adding one.
+    assert: ensure the untouched default limiters are kept and the configured ones applied.
+    """
+    defaults = """
+    ;; {:id :update-file :permits 20}
+    {:update-file/global {:permits 20}
+     :update-file/by-profile
+     {:permits 1 :queue 5}
+
+     :root/global
+     {:permits 40}}
+    """
+    config = generate_climit_config(
+        """
+        update-file/global: {permits: 10}
+        process-image/global: {permits: 8, queue: 64}
+        """,
+        defaults,
+    )
+    assert config == (
+        "{:update-file/global {:permits 10}\n"
+        " :update-file/by-profile {:permits 1 :queue 5}\n"
+        " :root/global {:permits 40}\n"
+        " :process-image/global {:permits 8 :queue 64}}\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "definitions, error",
+    [
+        pytest.param("[", "not valid YAML", id="yaml"),
+        pytest.param("- default", "must be a mapping", id="list"),
+        pytest.param(
+            "default: [{name: default, strategy: leaky, limit: 1/s}]",
+            "unknown strategy leaky",
+            id="strategy",
+        ),
+        pytest.param(
+            "default: [{name: default, strategy: window, limit: 1/1/1s}]",
+            "invalid window limit 1/1/1s",
+            id="limit",
+        ),
+        pytest.param("Get-Profile: [{name: a, strategy: window, limit: 1/s}]", "invalid method"),
+    ],
+)
+def test_invalid_rlimit_config(definitions: str, error: str):
+    """
+    arrange: write invalid rate limit definitions.
+    act: generate the rate limits file.
+    assert: ensure the error describes the invalid definition.
+    """
+    with pytest.raises(ValueError, match=error):
+        generate_rlimit_config(definitions)
+
+
+@pytest.mark.parametrize(
+    "definitions, error",
+    [
+        pytest.param(
+            "process-image/global: {queue: 4}", "process-image/global needs permits", id="permits"
+        ),
+        pytest.param(
+            "process-image/global: {permits: true}",
+            "process-image/global needs permits",
+            id="bool",
+        ),
+        pytest.param(
+            "process-image/global: {permits: 1, queue: false}",
+            "invalid process-image/global queue",
+            id="queue",
+        ),
+    ],
+)
+def test_invalid_climit_config(definitions: str, error: str):
+    """
+    arrange: write invalid concurrency limit definitions.
+    act: generate the concurrency limits file.
+    assert: ensure the error names the limiter.
+    """
+    with pytest.raises(ValueError, match=error):
+        generate_climit_config(definitions)